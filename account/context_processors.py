@@ -0,0 +1,18 @@
+"""
+This module contains the context processors of the account app.
+
+Functions:
+- roles: adds the 'user_manager' and 'user_auth' flags used by the navigation bar to every template.
+"""
+
+
+from django.utils.functional import SimpleLazyObject
+
+from .roles import is_manager
+
+
+def roles(request):
+    return {
+        'user_manager': SimpleLazyObject(lambda: is_manager(request)),
+        'user_auth': request.user.is_authenticated,
+    }
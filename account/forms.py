@@ -2,7 +2,8 @@
 This module contains two Django form classes: UserLogin and UserRegistration.
 
 UserLogin is a form for authenticating user login credentials. It takes a username and password input from the user,
-verifies that the username and password are valid, and raises a ValidationError if they are not.
+verifies that the username and password are valid, and raises a ValidationError if they are not. The credentials are
+checked with a single authenticate() call and the authenticated user is available through get_user().
 
 UserRegistration is a form for creating new user accounts. It takes a username, password, and password confirmation
 input from the user, verifies that the passwords match, and raises a ValidationError if they do not.
@@ -23,18 +24,26 @@ class UserLogin(forms.Form):
     username = forms.CharField(widget=forms.TextInput())
     password = forms.CharField(widget=forms.PasswordInput())
 
+    def __init__(self, *args, request=None, **kwargs):
+        self.request = request
+        self.user_cache = None
+        super().__init__(*args, **kwargs)
+
     def clean(self):
         username = self.cleaned_data.get('username')
         password = self.cleaned_data.get('password')
 
         if username and password:
-            user = authenticate(username=username, password=password)
-            if not user or not user.check_password(password):
+            self.user_cache = authenticate(self.request, username=username, password=password)
+            if self.user_cache is None:
                 raise forms.ValidationError('Error in Login or Password')
         else:
             raise forms.ValidationError('Error in Login or Password')
         return super().clean()
 
+    def get_user(self):
+        return self.user_cache
+
 
 class UserRegistration(forms.ModelForm):
 
@@ -0,0 +1,19 @@
+"""
+This module contains the password hasher of the site.
+
+ConfigurablePBKDF2PasswordHasher is Django's PBKDF2 hasher with the iteration count taken from the
+PASSWORD_HASH_ITERATIONS setting. It keeps the 'pbkdf2_sha256' algorithm name, so existing hashes stay valid;
+a hash stored with another iteration count is re-encoded with the configured one on the next successful login
+(Django's check_password calls the setter when must_update() is True).
+"""
+
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
@@ -0,0 +1,63 @@
+"""
+Management command that reports the CPU time of one login before and after the single-authenticate flow.
+
+Usage:
+    python manage.py bench_login [--logins N] [--iterations PBKDF2_ITERATIONS]
+
+'before' repeats what the old flow did per login: authenticate() and check_password() in UserLogin.clean and
+authenticate() again in login_view. 'after' is the current UserLogin validation, which authenticates once.
+"""
+
+
+import time
+
+from django.contrib.auth import authenticate, get_user_model
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from account.forms import UserLogin
+from main_page.benchmarks import benchmark_database
+
+
+USERNAME = 'bench-parent'
+PASSWORD = 'bench-password-123'
+
+
+def old_login():
+    user = authenticate(username=USERNAME, password=PASSWORD)
+    user.check_password(PASSWORD)
+    authenticate(username=USERNAME, password=PASSWORD)
+
+
+def new_login():
+    form = UserLogin({'username': USERNAME, 'password': PASSWORD})
+    assert form.is_valid()
+    form.get_user()
+
+
+class Command(BaseCommand):
+    help = 'Reports the CPU time per login of the old (three hashes) and the current (one hash) login flow.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=20, help='Logins per flow.')
+        parser.add_argument('--iterations', type=int, default=None,
+                            help='PBKDF2 iterations to benchmark with (default: PASSWORD_HASH_ITERATIONS).')
+
+    def _measure(self, flow, logins):
+        start = time.process_time()
+        for _ in range(logins):
+            flow()
+        return (time.process_time() - start) / logins * 1000
+
+    def handle(self, *args, **options):
+        overrides = {}
+        if options['iterations']:
+            overrides['PASSWORD_HASH_ITERATIONS'] = options['iterations']
+
+        with benchmark_database(), override_settings(**overrides):
+            get_user_model().objects.create_user(USERNAME, password=PASSWORD)
+            before = self._measure(old_login, options['logins'])
+            after = self._measure(new_login, options['logins'])
+
+        self.stdout.write(f'before: {before:.1f} ms CPU per login')
+        self.stdout.write(f' after: {after:.1f} ms CPU per login ({before / after:.1f}x less)')
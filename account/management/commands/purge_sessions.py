@@ -0,0 +1,42 @@
+"""
+Management command that deletes the expired sessions from the database in batches.
+
+Usage:
+    python manage.py purge_sessions [--batch-size N] [--pause SECONDS]
+
+Unlike clearsessions, which deletes all expired rows in one statement, every batch is a short DELETE by primary
+key, so the session table is not locked for long on a large backlog. With SESSION_STRATEGY=split only the manager
+sessions are in the database; the signed cookie sessions expire in the browsers.
+"""
+
+
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Deletes the expired database sessions in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Sessions deleted per statement (default: SESSION_PURGE_BATCH_SIZE).')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to wait between batches.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or settings.SESSION_PURGE_BATCH_SIZE
+        now = timezone.now()
+        deleted = 0
+        while True:
+            keys = list(
+                Session.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:batch_size]
+            )
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(f'{deleted} expired sessions deleted')
@@ -0,0 +1,122 @@
+"""
+This module contains the role resolver used by views and templates.
+
+Whether the current user is a manager is resolved once per request (kept on the request object) and once per
+session (kept in the session together with the role version it was computed for and the time it was computed at).
+Role versions live in the cache: a per-user version bumped when the user's groups change and a global one bumped
+when a group is saved or deleted, see account.signals. A changed version makes the value stored in the session
+stale, so it is recomputed on the next request. With the per-process local memory cache a bump is only seen by the
+worker that made it, so the value stored in the session is also recomputed once it is older than ROLE_MAX_AGE
+seconds, which bounds how long the other workers keep a revoked role.
+
+Functions:
+- get_role_version: returns the current role version of a user.
+- bump_role_version: invalidates the roles cached for a user, or for everybody when no user is given.
+- resolve_session_roles: returns the roles of a user, keeping them in the session.
+- session_has_manager: tells whether the roles kept in a session are those of a manager.
+- get_roles: returns the roles of the user of the request.
+- is_manager: returns True if the user of the request belongs to the 'manager' group.
+- manager_required: view decorator that lets only managers through.
+"""
+
+
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+
+
+MANAGER_GROUP = 'manager'
+SESSION_KEY = '_roles'
+GLOBAL_VERSION_KEY = 'roles:version'
+
+
+def _user_version_key(user_id):
+    return f'roles:version:{user_id}'
+
+
+def get_role_version(user_id):
+    """
+    Returns the current role version of a user; both version keys are read in one cache round trip.
+    :return: list of two ints
+    """
+    keys = [GLOBAL_VERSION_KEY, _user_version_key(user_id)]
+    versions = cache.get_many(keys)
+    return [versions.get(key, 0) for key in keys]
+
+
+def bump_role_version(user_id=None):
+    """
+    Invalidates the roles cached in the sessions of a user, or of all users when user_id is None.
+    """
+    key = GLOBAL_VERSION_KEY if user_id is None else _user_version_key(user_id)
+    cache.set(key, time.time_ns(), timeout=None)
+
+
+def resolve_session_roles(session, user):
+    """
+    Returns the roles of an authenticated user, from the session when they were computed for the current role
+    version less than ROLE_MAX_AGE seconds ago; otherwise they are computed and kept in the session, which is only
+    modified then.
+    :return: dict, e.g. {'manager': True}
+    """
+    version = get_role_version(user.pk)
+    now = time.time()
+    cached = session.get(SESSION_KEY)
+    if (cached and cached['user'] == user.pk and cached['version'] == version
+            and now - cached.get('time', 0) < settings.ROLE_MAX_AGE):
+        return cached['roles']
+
+    roles = {'manager': user.groups.filter(name=MANAGER_GROUP).exists()}
+    session[SESSION_KEY] = {'user': user.pk, 'version': version, 'time': now, 'roles': roles}
+    return roles
+
+
+def session_has_manager(session):
+    """
+    Tells whether the roles kept in a session, as last resolved, are those of a manager. Needs no query.
+    :return: bool
+    """
+    cached = session.get(SESSION_KEY)
+    return bool(cached and cached['roles'].get('manager'))
+
+
+def _resolve_roles(request):
+    user = request.user
+    if not user.is_authenticated:
+        return {'manager': False}
+    return resolve_session_roles(request.session, user)
+
+
+def get_roles(request):
+    """
+    Returns the roles of the user of the request, computing them at most once per request.
+    :return: dict, e.g. {'manager': True}
+    """
+    roles = getattr(request, '_roles', None)
+    if roles is None:
+        roles = request._roles = _resolve_roles(request)
+    return roles
+
+
+def is_manager(request):
+    return get_roles(request)['manager']
+
+
+def manager_required(view=None, login_url='/login/'):
+    """
+    Decorator for views that checks that the user is a manager, redirecting to the login page if necessary.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if is_manager(request):
+                return view_func(request, *args, **kwargs)
+            return redirect_to_login(request.get_full_path(), login_url)
+        return wrapper
+
+    if view:
+        return decorator(view)
+    return decorator
@@ -0,0 +1,125 @@
+"""
+This module contains the session strategy of the site.
+
+With SESSION_STRATEGY = 'split' the sessions of the public visitors, anonymous or logged-in parents, live in signed
+cookies (SESSION_ENGINE), so their requests never touch the session table. The sessions of the managers live in the
+database (MANAGER_SESSION_ENGINE, one primary key lookup per request on the small table of the manager sessions)
+under their own MANAGER_SESSION_COOKIE_NAME cookie, so deleting the row ends the session in every worker. A cached
+store is not used for them: with the per-process local memory cache a deleted session would stay valid in the
+workers that cached it. A session moves to the manager store in the response
+that stores the manager role in it (the login, see account.signals) and back to a signed cookie when the role is
+lost; logging out flushes the server-side session. With SESSION_STRATEGY = 'db' every session is kept by
+SESSION_ENGINE as with the plain SessionMiddleware.
+
+Sessions are saved only when modified (SESSION_SAVE_EVERY_REQUEST is off). The expired manager sessions are removed
+from the database by the purge_sessions management command.
+
+Classes:
+- SessionStrategyMiddleware: SessionMiddleware choosing the session store of every request.
+"""
+
+
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.exceptions import SessionInterrupted
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+
+from .roles import session_has_manager
+
+
+class SessionStrategyMiddleware(SessionMiddleware):
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.split = settings.SESSION_STRATEGY == 'split'
+        self.ManagerSessionStore = import_module(settings.MANAGER_SESSION_ENGINE).SessionStore
+
+    def process_request(self, request):
+        if not self.split:
+            return super().process_request(request)
+        manager_key = request.COOKIES.get(settings.MANAGER_SESSION_COOKIE_NAME)
+        if manager_key:
+            request.session = self.ManagerSessionStore(manager_key)
+        else:
+            request.session = self.SessionStore(request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+
+    def process_response(self, request, response):
+        if not self.split:
+            return super().process_response(request, response)
+        session = getattr(request, 'session', None)
+        if session is None:
+            return response
+
+        in_manager_store = isinstance(session, self.ManagerSessionStore)
+        if not session.is_empty():
+            # checking the role must not mark the session as accessed, which adds Vary: Cookie
+            accessed = session.accessed
+            manager = session_has_manager(session)
+            session.accessed = accessed
+            if manager != in_manager_store:
+                request.session = session = self._move(session, manager)
+                self._delete_cookie(request, response, self._cookie_name(in_manager_store))
+                in_manager_store = manager
+        return self._save(request, response, session, self._cookie_name(in_manager_store))
+
+    def _move(self, session, to_manager_store):
+        moved = self.ManagerSessionStore() if to_manager_store else self.SessionStore()
+        moved.update(dict(session.items()))
+        if not to_manager_store:
+            session.delete()
+        return moved
+
+    @staticmethod
+    def _cookie_name(manager_store):
+        return settings.MANAGER_SESSION_COOKIE_NAME if manager_store else settings.SESSION_COOKIE_NAME
+
+    @staticmethod
+    def _delete_cookie(request, response, cookie_name):
+        if cookie_name in request.COOKIES:
+            response.delete_cookie(
+                cookie_name,
+                path=settings.SESSION_COOKIE_PATH,
+                domain=settings.SESSION_COOKIE_DOMAIN,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+
+    def _save(self, request, response, session, cookie_name):
+        # SessionMiddleware.process_response for the cookie of the store the session is kept in
+        if session.is_empty():
+            if cookie_name in request.COOKIES:
+                self._delete_cookie(request, response, cookie_name)
+                patch_vary_headers(response, ('Cookie',))
+            return response
+
+        if session.accessed:
+            patch_vary_headers(response, ('Cookie',))
+        if (session.modified or settings.SESSION_SAVE_EVERY_REQUEST) and response.status_code != 500:
+            if session.get_expire_at_browser_close():
+                max_age = expires = None
+            else:
+                max_age = session.get_expiry_age()
+                expires = http_date(time.time() + max_age)
+            try:
+                session.save()
+            except UpdateError:
+                raise SessionInterrupted(
+                    "The request's session was deleted before the request completed. The user may have logged "
+                    "out in a concurrent request, for example."
+                )
+            response.set_cookie(
+                cookie_name,
+                session.session_key,
+                max_age=max_age,
+                expires=expires,
+                domain=settings.SESSION_COOKIE_DOMAIN,
+                path=settings.SESSION_COOKIE_PATH,
+                secure=settings.SESSION_COOKIE_SECURE or None,
+                httponly=settings.SESSION_COOKIE_HTTPONLY or None,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+        return response
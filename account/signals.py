@@ -0,0 +1,46 @@
+"""
+This module contains the signal receivers of the account app.
+
+Changes of group membership bump the role version of the affected users, and saving or deleting a group bumps the
+global role version, so that the roles cached in the sessions (see account.roles) are recomputed. The roles are
+resolved at login, so that the session of a manager moves to the server-side store with the login response
+(see account.sessions).
+"""
+
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_in
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+
+from .roles import bump_role_version, resolve_session_roles
+
+
+User = get_user_model()
+
+
+@receiver(m2m_changed, sender=User.groups.through, dispatch_uid='invalidate_user_roles')
+def invalidate_user_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        user_ids = pk_set if reverse else [instance.pk]
+    elif action == 'pre_clear' and reverse:
+        user_ids = list(instance.user_set.values_list('pk', flat=True))
+    elif action == 'post_clear' and not reverse:
+        user_ids = [instance.pk]
+    else:
+        return
+    for user_id in user_ids:
+        bump_role_version(user_id)
+
+
+@receiver(post_save, sender=Group, dispatch_uid='invalidate_roles_group_save')
+@receiver(post_delete, sender=Group, dispatch_uid='invalidate_roles_group_delete')
+def invalidate_roles(sender, **kwargs):
+    bump_role_version()
+
+
+@receiver(user_logged_in, dispatch_uid='resolve_roles_on_login')
+def resolve_roles_on_login(sender, request, user, **kwargs):
+    if request is not None and hasattr(request, 'session'):
+        request._roles = resolve_session_roles(request.session, user)
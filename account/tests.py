@@ -1,3 +1,131 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+from .hashers import ConfigurablePBKDF2PasswordHasher
+from .roles import MANAGER_GROUP
+
+
+PASSWORD = 'session-password-123'
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class LoginTest(TestCase):
+    """
+    A login verifies the password once, and a hash stored with another iteration count is upgraded by it.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_single_password_check(self):
+        user = get_user_model().objects.create_user('hashed-parent', password=PASSWORD)
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+
+        verify = ConfigurablePBKDF2PasswordHasher.verify
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000), mock.patch.object(
+                ConfigurablePBKDF2PasswordHasher, 'verify', autospec=True, side_effect=verify) as calls:
+            response = self.client.post(reverse('login_view'), {'username': user.username, 'password': PASSWORD})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(calls.call_count, 1)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+        self.assertTrue(user.check_password(PASSWORD))
+
+
+@override_settings(SESSION_STRATEGY='split', SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+class SessionStrategyTest(TestCase):
+    """
+    Parents keep their session in a signed cookie and never touch the session table; managers keep it in the
+    database, where deleting it ends it.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.parent = User.objects.create_user('session-parent', password=PASSWORD)
+        cls.manager = User.objects.create_user('session-manager', password=PASSWORD)
+        cls.manager.groups.add(Group.objects.get_or_create(name=MANAGER_GROUP)[0])
+
+    def setUp(self):
+        # the role versions and the login throttle of the other tests
+        cache.clear()
+
+    def login(self, user):
+        response = self.client.post(reverse('login_view'), {'username': user.username, 'password': PASSWORD})
+        self.assertEqual(response.status_code, 302)
+        return response
+
+    def session_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return [query['sql'] for query in queries if 'django_session' in query['sql']]
+
+    def test_parent_session_is_a_signed_cookie(self):
+        response = self.login(self.parent)
+        self.assertIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertNotIn(settings.MANAGER_SESSION_COOKIE_NAME, response.cookies)
+        self.assertFalse(Session.objects.exists())
+        self.assertEqual(self.session_queries(reverse('about')), [])
+
+    def test_manager_session_is_kept_on_the_server(self):
+        response = self.login(self.manager)
+        self.assertIn(settings.MANAGER_SESSION_COOKIE_NAME, response.cookies)
+        self.assertEqual(Session.objects.count(), 1)
+        self.assertEqual(len(self.session_queries(reverse('main_page:manager_list'))), 1)
+
+        self.client.get(reverse('logout_view'))
+        self.assertFalse(Session.objects.exists())
+        self.assertEqual(self.client.get(reverse('main_page:manager_list')).status_code, 302)
+
+    def test_deleted_manager_session_is_revoked(self):
+        self.login(self.manager)
+        self.assertEqual(self.client.get(reverse('main_page:manager_list')).status_code, 200)
+        Session.objects.all().delete()
+        self.assertEqual(self.client.get(reverse('main_page:manager_list')).status_code, 302)
+
+    def test_group_changes_apply_at_once(self):
+        self.login(self.parent)
+        url = reverse('main_page:manager_list')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        manager_group = Group.objects.get(name=MANAGER_GROUP)
+
+        self.parent.groups.add(manager_group)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        manager_group.user_set.remove(self.parent)
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.parent.groups.add(manager_group)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.parent.groups.clear()
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_roles_expire_without_a_version_bump(self):
+        self.login(self.manager)
+        # a group change made by another worker, whose role version bump this worker does not see
+        get_user_model().groups.through.objects.filter(user=self.manager).delete()
+        self.assertEqual(self.client.get(reverse('main_page:manager_list')).status_code, 200)
+        with override_settings(ROLE_MAX_AGE=0):
+            self.assertEqual(self.client.get(reverse('main_page:manager_list')).status_code, 302)
+
+    def test_purge_sessions(self):
+        expired = timezone.now() - timedelta(days=1)
+        Session.objects.bulk_create(
+            Session(session_key=f'expired{i}', session_data='', expire_date=expired) for i in range(5)
+        )
+        Session.objects.create(session_key='current', session_data='', expire_date=timezone.now() + timedelta(days=1))
+        output = StringIO()
+        call_command('purge_sessions', batch_size=2, stdout=output)
+        self.assertEqual(output.getvalue().strip(), '5 expired sessions deleted')
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['current'])
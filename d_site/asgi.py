@@ -3,6 +3,9 @@ ASGI config for d_site project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The public pages are served by the async views of main_page.async_views unless ASYNC_VIEWS=0.
+Run it with an ASGI server, e.g. gunicorn d_site.asgi -k uvicorn.workers.UvicornWorker.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 """
@@ -12,5 +15,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'd_site.settings')
+os.environ.setdefault('ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -0,0 +1,43 @@
+"""
+gunicorn configuration of the web process (see Procfile).
+
+With GUNICORN_WARMUP=1 (the default) the app is preloaded in the master, warmed up by main_page.warmup and the
+garbage collector heap is frozen before the workers are forked, so every worker starts with compiled templates and
+primed caches that it shares copy-on-write with the others. GUNICORN_WARMUP=0 restores the plain gunicorn boot
+where every worker imports and warms up the app on its own.
+
+The metrics files of the previous run and the counts of the warm-up requests are cleared before the workers start,
+see main_page.metrics.
+
+The number of workers is set by WEB_CONCURRENCY, as gunicorn does by default. With the preloaded app a code change
+needs a full restart; HUP only replaces the workers.
+"""
+
+import gc
+import os
+
+
+warm_up = os.environ.get('GUNICORN_WARMUP', '1') == '1'
+preload_app = warm_up
+
+if warm_up:
+    # no collections while the app is loaded, so the long-lived objects end up packed together; gunicorn reads this
+    # file before it preloads the app, whereas the on_starting hook only runs after the preload
+    gc.disable()
+
+
+def when_ready(server):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'd_site.settings')
+    from main_page.metrics import clear_metrics
+
+    if not warm_up:
+        clear_metrics()
+        return
+
+    from main_page.warmup import warm_up as run_warm_up
+
+    run_warm_up()
+    clear_metrics()
+    gc.collect()
+    gc.freeze()
+    gc.enable()
@@ -50,14 +50,20 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main_page.query_budget.QueryBudgetMiddleware',
+    'main_page.server_timing.ServerTimingMiddleware',
+    'main_page.metrics.MetricsMiddleware',
+    'main_page.slow_queries.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'account.sessions.SessionStrategyMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'main_page.throttle.ThrottleMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'main_page.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'd_site.urls'
@@ -74,6 +80,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'account.context_processors.roles',
             ],
         },
     },
@@ -81,6 +88,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'd_site.wsgi.application'
 
+# Serve the public pages with the async views of main_page.async_views; d_site.asgi turns it on.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
@@ -101,8 +111,111 @@ DATABASES = {
 
 import dj_database_url
 db = dj_database_url.config()
+if db.get('ENGINE', DATABASES['default']['ENGINE']) != DATABASES['default']['ENGINE']:
+    # sql_mode is MySQL only, drop it for e.g. DATABASE_URL=sqlite:///db.sqlite3 used for local runs and tests
+    DATABASES['default'].pop('OPTIONS')
 DATABASES['default'].update(db)
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Local memory is per worker; set CACHE_BACKEND/CACHE_LOCATION to a file based, database or memcached backend
+# so that all gunicorn workers share the cached content.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'kider'),
+    }
+}
+
+CONTENT_CACHE_ALIAS = 'default'
+CONTENT_CACHE_TIMEOUT = int(os.environ.get('CONTENT_CACHE_TIMEOUT', 60 * 60 * 24))
+# The content version is shared through the database and re-read by every worker after this many seconds,
+# see main_page.content_cache.
+CONTENT_VERSION_MAX_AGE = int(os.environ.get('CONTENT_VERSION_MAX_AGE', 5))
+
+PAGE_CACHE_ALIAS = 'default'
+PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', 60 * 5))
+
+# Sessions, see account.sessions: with SESSION_STRATEGY=split the public visitors keep their session in a signed
+# cookie and the managers in the database (MANAGER_SESSION_ENGINE); SESSION_STRATEGY=db keeps every session in the
+# database. Sessions are written only when they change.
+# The expired database sessions are removed by manage.py purge_sessions.
+
+SESSION_STRATEGY = os.environ.get('SESSION_STRATEGY', 'split')
+SESSION_ENGINE = ('django.contrib.sessions.backends.signed_cookies' if SESSION_STRATEGY == 'split'
+                  else 'django.contrib.sessions.backends.db')
+SESSION_SAVE_EVERY_REQUEST = False
+MANAGER_SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+MANAGER_SESSION_COOKIE_NAME = 'managersessionid'
+SESSION_PURGE_BATCH_SIZE = int(os.environ.get('SESSION_PURGE_BATCH_SIZE', 1000))
+
+# The roles kept in a session are recomputed after ROLE_MAX_AGE seconds, see account.roles: with the per-process
+# local memory cache a role change is seen at once by the worker that made it and by the others within this time.
+
+ROLE_MAX_AGE = int(os.environ.get('ROLE_MAX_AGE', 60))
+
+# Write-behind queue for the public form submissions, see main_page.submission_queue
+
+FORM_WRITE_BEHIND = os.environ.get('FORM_WRITE_BEHIND') == '1'
+FORM_SPOOL_DIR = os.environ.get('FORM_SPOOL_DIR', os.path.join(BASE_DIR, 'spool'))
+FORM_SPOOL_BATCH_SIZE = int(os.environ.get('FORM_SPOOL_BATCH_SIZE', 500))
+
+# Rate limiting of POST requests, see main_page.throttle
+# Rates are (requests, period in seconds) per scope and client; use a shared CACHE_BACKEND for a limit across workers.
+# The client is identified by the X-Forwarded-For entry of the last of THROTTLE_PROXY_COUNT proxies: 1 for the
+# Heroku router of the Procfile deploy, 0 when the clients connect to gunicorn directly.
+
+THROTTLE_ENABLED = os.environ.get('THROTTLE_ENABLED', '1') == '1'
+THROTTLE_CACHE_ALIAS = 'default'
+THROTTLE_PROXY_COUNT = int(os.environ.get('THROTTLE_PROXY_COUNT', 1))
+THROTTLE_RATES = {
+    'login': (5, 60),
+    'form': (10, 60),
+}
+
+# Log the requests exceeding the query budget of their view with the stack traces of the repeated queries,
+# see main_page.query_budget. Development only: every query records its stack.
+
+QUERY_BUDGET_CHECKS = os.environ.get('QUERY_BUDGET_CHECKS') == '1'
+
+# Fraction of the requests measured by main_page.server_timing (a JSON log line with the database, template and
+# view times, also sent in the Server-Timing header to staff users). 0 removes the middleware.
+
+SERVER_TIMING_SAMPLE_RATE = float(os.environ.get('SERVER_TIMING_SAMPLE_RATE', '0'))
+
+# cProfile capture of the views, see main_page.profiling: a sampled fraction of the requests, the requests with a
+# signed PROFILE_HEADER token (manage.py profile_report --token) and the staff requests with ?profile.
+# The newest PROFILE_MAX_FILES captures are kept in PROFILE_DIR.
+
+PROFILING = os.environ.get('PROFILING', '1') == '1'
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_HEADER = 'X-Profile-Token'
+PROFILE_TOKEN_MAX_AGE = int(os.environ.get('PROFILE_TOKEN_MAX_AGE', 60 * 60))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 200))
+
+# Request, database, form and login metrics, see main_page.metrics. Every worker writes its counts to METRICS_DIR
+# at most every METRICS_FLUSH_INTERVAL seconds; /metrics/ merges them for staff users and for the scrapers sending
+# 'Authorization: Bearer <METRICS_TOKEN>'.
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(BASE_DIR, 'metrics'))
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Queries slower than SLOW_QUERY_THRESHOLD_MS are captured with their view, stack and EXPLAIN plan in a ring buffer
+# of SLOW_QUERY_BUFFER_SIZE entries per process, shown to staff users at /manager/slow_queries/,
+# see main_page.slow_queries.
+
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG', '1') == '1'
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100))
+SLOW_QUERY_BUFFER_SIZE = int(os.environ.get('SLOW_QUERY_BUFFER_SIZE', 100))
+
+# Unprocessed requests per list and page on the manager work list
+
+MANAGER_PAGE_SIZE = int(os.environ.get('MANAGER_PAGE_SIZE', 50))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -122,6 +235,21 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# https://docs.djangoproject.com/en/4.1/topics/auth/passwords/
+# Hashes stored with another iteration count are upgraded on the next successful login.
+
+PASSWORD_HASHERS = [
+    'account.hashers.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 390000))
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.1/topics/i18n/
 
@@ -144,9 +272,33 @@ STATICFILES_DIRS = (
     os.path.join(BASE_DIR, 'static'),
 )
 
+# CSS/JS bundles of main.html built into STATIC_ROOT/bundles by manage.py build_bundles, see main_page.bundles.
+# WhiteNoise serves their precompressed .gz/.br copies and, as they are named by content hash, caches them forever.
+
+ASSET_BUNDLES = os.environ.get('ASSET_BUNDLES', '0' if DEBUG else '1') == '1'
+WHITENOISE_IMMUTABLE_FILE_TEST = r'/bundles/[^/]+\.[0-9a-f]{12}\.(css|js)$'
+
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 
+# Uploads are named by their content hash, see main_page.storage.
+# Media is served by main_page.views.serve_media with immutable cache headers; set SERVE_MEDIA=0 when the web server
+# serves MEDIA_ROOT itself, or MEDIA_ACCEL_REDIRECT to an nginx internal location aliased to MEDIA_ROOT
+# (e.g. '/protected-media/') to let nginx send the files.
+
+DEFAULT_FILE_STORAGE = 'main_page.storage.ContentAddressedStorage'
+SERVE_MEDIA = os.environ.get('SERVE_MEDIA', '1') == '1'
+MEDIA_ACCEL_REDIRECT = os.environ.get('MEDIA_ACCEL_REDIRECT', '')
+
+# Resized renditions of the uploaded images, see main_page.image_variants
+
+IMAGE_VARIANT_WIDTHS = (90, 360, 720, 1280)
+IMAGE_VARIANT_QUALITY = int(os.environ.get('IMAGE_VARIANT_QUALITY', 80))
+
+# The tests write the metrics, profiles and spooled submissions to a temporary directory, see d_site.test_runner
+
+TEST_RUNNER = 'd_site.test_runner.TestRunner'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
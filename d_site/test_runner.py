@@ -0,0 +1,33 @@
+"""
+Test runner of the site.
+
+Classes:
+- TestRunner: DiscoverRunner writing the metrics, profiles and spooled submissions to a temporary directory.
+"""
+
+import os
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._directory = tempfile.TemporaryDirectory()
+        self._settings = override_settings(
+            METRICS_DIR=os.path.join(self._directory.name, 'metrics'),
+            PROFILE_DIR=os.path.join(self._directory.name, 'profiles'),
+            FORM_SPOOL_DIR=os.path.join(self._directory.name, 'spool'),
+        )
+        self._settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        from main_page.metrics import clear_metrics
+
+        clear_metrics()
+        self._settings.disable()
+        self._directory.cleanup()
+        super().teardown_test_environment(**kwargs)
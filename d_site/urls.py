@@ -13,27 +13,34 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
-from main_page.views import about, contacts, classes, join_us, schedule
+from main_page import async_views, views
+from main_page.views import serve_media
 from account.views import registration_view, login_view, logout_view
 
 
+# the async views are served under ASGI, see d_site.asgi
+public_views = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
     path('', include('main_page.urls')),
     path('admin/', admin.site.urls),
-    path('about/', about, name='about'),
-    path('contacts/', contacts, name='contacts'),
-    path('classes/', classes, name='classes'),
-    path('join_us/', join_us, name='join_us'),
+    path('about/', public_views.about, name='about'),
+    path('contacts/', public_views.contacts, name='contacts'),
+    path('classes/', public_views.classes, name='classes'),
+    path('join_us/', public_views.join_us, name='join_us'),
     path('logout/', logout_view, name='logout_view'),
     path('login/', login_view, name='login_view'),
     path('registration/', registration_view, name='registration_view'),
-    path('schedule/', schedule, name='schedule'),
+    path('schedule/', public_views.schedule, name='schedule'),
 
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+if settings.SERVE_MEDIA:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='media'),
+    ]
\ No newline at end of file
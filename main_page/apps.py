@@ -5,3 +5,6 @@ class MainPageConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main_page'
     verbose_name = 'Kider main page'
+
+    def ready(self):
+        from . import signals  # noqa: F401
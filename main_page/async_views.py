@@ -0,0 +1,63 @@
+"""
+This module defines the async versions of the public views, served instead of the views of `main_page.views` when
+ASYNC_VIEWS is on (the default of `d_site.asgi`):
+- `index(request)`, `about(request)`, `contacts(request)`, `classes(request)`, `join_us(request)` and
+`schedule(request)` render the same templates as their synchronous counterparts.
+
+The context is loaded with `main_page.context_data.aget_page_context`, which reads the content blocks with the async
+cache API and the async ORM and draws the random samples at the same time with `asyncio.gather`. The template is then
+rendered in the sync thread, so the event loop keeps serving other requests meanwhile.
+
+POST requests are handed to the synchronous view, which validates and saves the form.
+
+Run them under an ASGI server, e.g. `gunicorn d_site.asgi -k uvicorn.workers.UvicornWorker`.
+"""
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import render
+from . import views
+from .context_data import aget_page_context
+from .page_cache import cache_public_page
+
+
+async def render_public_page(request, template_name, sync_view):
+    """
+    Renders a public page from the concurrently loaded context.
+
+    Args:
+    - request: HttpRequest object.
+    - template_name: name of the rendered template, a key of `PAGE_BLOCKS`.
+    - sync_view: the view of `main_page.views` that handles the POST requests of the page.
+
+    Returns:
+    - HttpResponse.
+    """
+    if request.method == 'POST':
+        return await sync_to_async(sync_view)(request)
+
+    data = await aget_page_context(request, template_name)
+    return await sync_to_async(render)(request, template_name, context=data)
+
+@cache_public_page
+async def index(request):
+    return await render_public_page(request, 'index.html', views.index)
+
+@cache_public_page
+async def about(request):
+    return await render_public_page(request, 'about.html', views.about)
+
+@cache_public_page
+async def contacts(request):
+    return await render_public_page(request, 'contact.html', views.contacts)
+
+@cache_public_page
+async def classes(request):
+    return await render_public_page(request, 'classes.html', views.classes)
+
+@cache_public_page
+async def join_us(request):
+    return await render_public_page(request, 'join_us.html', views.join_us)
+
+
+async def schedule(request):
+    return await render_public_page(request, 'schedule.html', views.schedule)
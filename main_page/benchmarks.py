@@ -0,0 +1,154 @@
+"""
+Module containing helpers shared by the benchmark management commands.
+
+The benchmarks never touch the configured database, cache or metrics directory: they run against a throwaway test
+database (created and destroyed like the test runner does) and a private local memory cache. The benchmarks of real
+gunicorn servers run them against a throwaway SQLite database loaded with data.json instead.
+
+Functions:
+- benchmark_database: context manager that sets up the throwaway database and cache.
+- server_environment: context manager that yields the environment of a server using a throwaway SQLite database.
+- run_gunicorn: context manager that starts gunicorn on a free port and stops it on exit.
+- percentile: returns the nearest-rank percentile of a list of samples.
+- summarize: returns count, mean and p50/p95/p99 of latency samples in milliseconds.
+"""
+
+
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from .metrics import clear_metrics
+
+
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'kider-benchmark',
+    }
+}
+
+
+@contextmanager
+def benchmark_database(fixtures=(), sqlite_file=None):
+    """
+    Creates a test database, loads the fixtures and yields; the database is destroyed on exit. The metrics of the
+    requests are written to a temporary METRICS_DIR.
+
+    Args:
+    - fixtures: fixture names or paths passed to loaddata.
+    - sqlite_file: with SQLite, create the test database in this file instead of in memory, so that concurrent
+      threads get their own connections instead of sharing one in-memory database with table-level locks.
+    """
+    setup_test_environment()
+    if sqlite_file and connection.vendor == 'sqlite':
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = sqlite_file
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with tempfile.TemporaryDirectory() as metrics_dir, \
+                override_settings(CACHES=BENCHMARK_CACHES, METRICS_DIR=metrics_dir):
+            try:
+                if fixtures:
+                    call_command('loaddata', *fixtures, verbosity=0)
+                yield
+            finally:
+                clear_metrics()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+@contextmanager
+def server_environment(fixtures=('data.json',)):
+    """
+    Creates a migrated SQLite database with the fixtures in a temporary directory and yields the environment
+    variables pointing a server process at it. The directory is removed on exit.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ,
+            'DATABASE_URL': f'sqlite:///{os.path.join(directory, "bench.sqlite3")}',
+            'FORM_SPOOL_DIR': os.path.join(directory, 'spool'),
+            'METRICS_DIR': os.path.join(directory, 'metrics'),
+        }
+        manage = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py')]
+        subprocess.run([*manage, 'migrate', '--verbosity', '0'], env=env, check=True)
+        for fixture in fixtures:
+            subprocess.run([*manage, 'loaddata', str(settings.BASE_DIR / fixture), '--verbosity', '0'],
+                           env=env, check=True)
+        yield env
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def run_gunicorn(arguments, env, timeout=60):
+    """
+    Starts gunicorn with the given arguments on a free local port and waits until it accepts connections.
+
+    Args:
+    - arguments: gunicorn arguments, starting with the app module.
+    - env: environment variables of the server.
+    - timeout: seconds to wait for the server.
+
+    Yields:
+    - (port, subprocess.Popen) of the running master.
+    """
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', *arguments, '--bind', f'127.0.0.1:{port}', '--log-level', 'error'],
+        env=env, cwd=settings.BASE_DIR,
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if process.poll() is not None:
+                raise CommandError(f'The server exited with code {process.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise CommandError(f'The server did not listen on port {port} within {timeout}s')
+                time.sleep(0.05)
+        yield port, process
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def percentile(samples, percent):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(samples):
+    """
+    Summarizes latency samples given in seconds.
+    :return: dict with count, mean_ms, p50_ms, p95_ms and p99_ms
+    """
+    return {
+        'count': len(samples),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+    }
@@ -0,0 +1,166 @@
+"""
+Module containing the static asset bundles of main.html.
+
+The stylesheets and scripts every page loads are concatenated into one CSS and one JS bundle, minified and named
+by their content hash, then precompressed with gzip (and brotli when installed) next to the bundle, where WhiteNoise
+picks the compressed file the browser accepts. The bundles are written to STATIC_ROOT/bundles by the build_bundles
+management command after collectstatic; the bundle template tag (see main_page.templatetags.bundle_tags) links them
+when ASSET_BUNDLES is on and falls back to the individual files otherwise.
+
+Attributes:
+- BUNDLES: the static files of each bundle, in the order main.html loads them.
+
+Functions:
+- minify_css: strips comments and whitespace from a stylesheet.
+- minify_js: minifies a script with rjsmin when it is installed.
+- build_bundles: builds, hashes and precompresses all bundles and writes their manifest.
+- get_bundle_manifest: returns the bundle names mapped to their hashed static paths.
+"""
+
+
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+
+BUNDLES = {
+    'main.css': (
+        'lib/animate/animate.min.css',
+        'lib/owlcarousel/assets/owl.carousel.min.css',
+        'css/bootstrap.min.css',
+        'css/style.css',
+    ),
+    'main.js': (
+        'js/jquery-3.4.1.min.js',
+        'js/bootstrap.bundle.min.js',
+        'lib/wow/wow.min.js',
+        'lib/easing/easing.min.js',
+        'lib/waypoints/waypoints.min.js',
+        'lib/owlcarousel/owl.carousel.min.js',
+        'js/main.js',
+    ),
+}
+BUNDLE_DIR = 'bundles'
+MANIFEST_NAME = 'manifest.json'
+
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+CSS_CHARSET = re.compile(r'@charset\s+[^;]+;\s*', re.I)
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+CSS_SPACE = re.compile(r'\s*([{};,>])\s*')
+
+
+def minify_css(text):
+    """
+    Strips the comments and the insignificant whitespace of a stylesheet.
+    :param text: str, CSS
+    :return: str, minified CSS
+    """
+    text = CSS_COMMENT.sub('', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = CSS_SPACE.sub(r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    """
+    Minifies a script with rjsmin; without it the script is kept as is (the libraries are shipped minified).
+    :param text: str, JavaScript
+    :return: str
+    """
+    return rjsmin.jsmin(text) if rjsmin is not None else text
+
+
+def _rewrite_urls(text, path):
+    """Makes the relative url() references of a stylesheet relative to the bundle directory."""
+    def rewrite(match):
+        url = match.group(2).strip()
+        if url.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return match.group(0)
+        target, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(path), target))
+        return 'url("%s%s")' % (posixpath.relpath(target, BUNDLE_DIR), suffix)
+    return CSS_URL.sub(rewrite, text)
+
+
+def _read(path):
+    full_path = finders.find(path)
+    if full_path is None:
+        raise FileNotFoundError(f'Static file {path} of the bundles was not found')
+    with open(full_path, encoding='utf-8') as file:
+        return file.read()
+
+
+def _build(name):
+    if name.endswith('.css'):
+        parts = [minify_css(_rewrite_urls(CSS_CHARSET.sub('', _read(path)), path)) for path in BUNDLES[name]]
+        return '@charset "UTF-8";' + '\n'.join(parts)
+    # a script without a trailing semicolon must not run into the next one
+    return ';\n'.join(minify_js(_read(path)).strip().rstrip(';') for path in BUNDLES[name]) + ';'
+
+
+def build_bundles(output_dir=None):
+    """
+    Builds every bundle of BUNDLES as '<name>.<hash>.<ext>' with its .gz (and .br) precompressed copies, and
+    writes the manifest the bundle template tag reads. Previous bundles are kept for the pages still cached with
+    their links.
+
+    Args:
+    - output_dir: directory of the bundles, STATIC_ROOT/bundles by default.
+
+    Returns:
+    - dict mapping the bundle name to (static path, size, gzip size, brotli size or None).
+    """
+    output_dir = output_dir or os.path.join(settings.STATIC_ROOT, BUNDLE_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+
+    built = {}
+    for name in BUNDLES:
+        data = _build(name).encode('utf-8')
+        stem, ext = os.path.splitext(name)
+        filename = f'{stem}.{hashlib.md5(data).hexdigest()[:12]}{ext}'
+        compressed = {'.gz': gzip.compress(data, 9, mtime=0)}
+        if brotli is not None:
+            compressed['.br'] = brotli.compress(data)
+        for suffix, content in (('', data), *compressed.items()):
+            with open(os.path.join(output_dir, filename + suffix), 'wb') as file:
+                file.write(content)
+        built[name] = (
+            posixpath.join(BUNDLE_DIR, filename), len(data), len(compressed['.gz']),
+            len(compressed['.br']) if '.br' in compressed else None,
+        )
+
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w') as file:
+        json.dump({name: values[0] for name, values in built.items()}, file, indent=2)
+    get_bundle_manifest.cache_clear()
+    return built
+
+
+@lru_cache(maxsize=None)
+def get_bundle_manifest():
+    """
+    Reads the bundle manifest once per process.
+    :return: dict mapping the bundle name to its hashed static path, empty when the bundles were not built
+    """
+    try:
+        with open(os.path.join(settings.STATIC_ROOT, BUNDLE_DIR, MANIFEST_NAME)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
@@ -0,0 +1,126 @@
+"""
+Module containing the versioned cache for the site content shown on the public pages.
+
+The materialized content (slider, team, singletons, ...) is stored once per content version in the cache backend
+selected by the CONTENT_CACHE_ALIAS setting. Every key includes the current version, so bumping the version makes
+all previously cached content unreachable at once; the old entries simply expire. The version is bumped by the
+post_save/post_delete receivers in main_page.signals.
+
+The version is the update time of the SiteSnapshot row, so it is shared by all workers whatever the cache backend.
+Each worker keeps it in the cache for CONTENT_VERSION_MAX_AGE seconds, so with the local memory backend the
+workers that did not handle an admin save serve the previous content for at most that long, at the cost of one
+primary key query per worker every CONTENT_VERSION_MAX_AGE seconds.
+
+Functions:
+- get_content_version: returns the current content version.
+- bump_content_version: starts a new content version, invalidating everything cached for the previous one.
+- get_content: returns the requested content blocks, building and caching the missing ones.
+- aget_content: the same for async views, building the missing blocks concurrently.
+"""
+
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .models import SiteSnapshot
+from .snapshot import SNAPSHOT_ID, build_site_snapshot
+
+
+VERSION_KEY = 'content:version'
+
+
+def _get_cache():
+    return caches[settings.CONTENT_CACHE_ALIAS]
+
+
+def _read_version():
+    updated = SiteSnapshot.objects.filter(id=SNAPSHOT_ID).values_list('updated', flat=True).first()
+    if updated is None:
+        build_site_snapshot()
+        updated = SiteSnapshot.objects.filter(id=SNAPSHOT_ID).values_list('updated', flat=True).first()
+    return int(updated.timestamp() * 1_000_000)
+
+
+def get_content_version():
+    """
+    Returns the current content version, read from the database at most every CONTENT_VERSION_MAX_AGE seconds.
+    :return: int
+    """
+    cache = _get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = _read_version()
+        cache.set(VERSION_KEY, version, timeout=settings.CONTENT_VERSION_MAX_AGE)
+    return version
+
+
+def bump_content_version():
+    """
+    Starts a new content version. Content cached for the previous version is never read again.
+    :return: int, the new version
+    """
+    if not SiteSnapshot.objects.filter(id=SNAPSHOT_ID).update(updated=timezone.now()):
+        build_site_snapshot()
+    version = _read_version()
+    _get_cache().set(VERSION_KEY, version, timeout=settings.CONTENT_VERSION_MAX_AGE)
+    return version
+
+
+def get_content(builders):
+    """
+    Returns the content blocks for the current content version.
+
+    All blocks are read from the cache in one round trip; the missing ones are built by calling their builder and
+    stored back in one round trip as well.
+
+    Args:
+    - builders: dictionary mapping the block name to a callable without arguments that loads the block.
+
+    Returns:
+    - dictionary mapping the block name to its materialized value.
+    """
+    cache = _get_cache()
+    version = get_content_version()
+    keys = {f'content:{version}:{name}': name for name in builders}
+    cached = cache.get_many(keys)
+
+    content = {keys[key]: value for key, value in cached.items()}
+    missing = {}
+    for key, name in keys.items():
+        if key not in cached:
+            missing[key] = content[name] = builders[name]()
+    if missing:
+        cache.set_many(missing, timeout=settings.CONTENT_CACHE_TIMEOUT)
+    return content
+
+
+async def aget_content(builders):
+    """
+    Async version of get_content: the cache is read and written with the async cache API and the missing blocks are
+    built concurrently with asyncio.gather.
+
+    Args:
+    - builders: dictionary mapping the block name to an async callable without arguments that loads the block.
+
+    Returns:
+    - dictionary mapping the block name to its materialized value.
+    """
+    cache = _get_cache()
+    version = await sync_to_async(get_content_version)()
+    keys = {f'content:{version}:{name}': name for name in builders}
+    cached = await cache.aget_many(keys)
+
+    content = {keys[key]: value for key, value in cached.items()}
+    missing_keys = [key for key in keys if key not in cached]
+    values = await asyncio.gather(*(builders[keys[key]]() for key in missing_keys))
+    missing = dict(zip(missing_keys, values))
+    for key, value in missing.items():
+        content[keys[key]] = value
+    if missing:
+        await cache.aset_many(missing, timeout=settings.CONTENT_CACHE_TIMEOUT)
+    return content
@@ -1,57 +1,195 @@
 """
 Module containing functions related to obtaining page context.
 
+Attributes:
+- RELATIONS: joins and prefetches the template includes need, keyed by the context variable they render.
+- CONTENT_QUERIES: querysets of the content blocks that are lists of rows.
+- CONTENT_BLOCKS: builders of the content blocks that are cached per content version (see main_page.content_cache).
+- ASYNC_CONTENT_BLOCKS: async builders of the same blocks, loading the rows with the async ORM.
+- CONTEXT_BUILDERS: builders of the context variables that are created for every request (random samples, forms).
+- PAGE_BLOCKS: the context variables each page template renders, including its includes and main.html.
+
 Functions:
+- with_relations: applies the declared joins and prefetches of a context variable to a queryset.
 - get_common_context: gets the common page context used across multiple pages of the site.
 - get_page_context: gets the page context with the current request taken into account.
+- aget_page_context: gets the page context for the async views, loading independent blocks concurrently.
 """
 
 
-from .forms import MakeAppointmentForm, SubscriptionForm, ContactUsForm
-from .models import Slider, Team, About, Testimonial, Classes, Facilities, Call, Gallery, Contacts, Schedule, Headlines
+import asyncio
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.utils.functional import SimpleLazyObject
+
+from .content_cache import aget_content, get_content
+from .forms import POST_FORMS, MakeAppointmentForm, SubscriptionForm, ContactUsForm
+from .models import Slider, Team, Testimonial, Classes, Gallery
+from .sampling import sample_visible
+from .snapshot import SECTIONS, load_site_settings
+
+
+RELATIONS = {
+    # classes_block.html and classes.html render clas.teacher.name, .profession and .image_clas
+    'classes': {'select_related': ('teacher',)},
+    # team.html and testimonial.html render only the columns of their own rows
+    'team': {},
+    'testimonial': {},
+}
+
+
+def with_relations(queryset, name):
+    """
+    Applies the joins and prefetches declared in RELATIONS for the given context variable.
+
+    Args:
+    - queryset: QuerySet feeding the context variable.
+    - name: name of the context variable.
+
+    Returns:
+    - QuerySet with select_related/prefetch_related applied.
+    """
+    relations = RELATIONS.get(name, {})
+    if relations.get('select_related'):
+        queryset = queryset.select_related(*relations['select_related'])
+    if relations.get('prefetch_related'):
+        queryset = queryset.prefetch_related(*relations['prefetch_related'])
+    return queryset
+
+
+CONTENT_QUERIES = {
+    'slider': lambda: Slider.objects.filter(is_visible=True),
+    'team': lambda: with_relations(Team.objects.all(), 'team')[:3],
+    'testimonial': lambda: with_relations(Testimonial.objects.filter(is_visible=True), 'testimonial'),
+}
+
+
+def _load_rows(query):
+    return list(query())
+
+
+async def _aload_rows(query):
+    return [row async for row in query()]
+
+
+CONTENT_BLOCKS = {
+    **{name: partial(_load_rows, query) for name, query in CONTENT_QUERIES.items()},
+    'site_settings': load_site_settings,
+}
+
+ASYNC_CONTENT_BLOCKS = {
+    **{name: partial(_aload_rows, query) for name, query in CONTENT_QUERIES.items()},
+    'site_settings': sync_to_async(load_site_settings),
+}
+
+CONTEXT_BUILDERS = {
+    'classes': lambda: sample_visible(with_relations(Classes.objects.all(), 'classes'), 6),
+    'gallery': lambda: sample_visible(Gallery.objects.all(), 6),
+    'make_appointment': MakeAppointmentForm,
+    'subscription': SubscriptionForm,
+    'contact_us': ContactUsForm,
+}
+
+# main.html renders the contacts and gallery in the footer and the subscription form on every page
+BASE_BLOCKS = ('contacts', 'gallery', 'subscription')
+
+PAGE_BLOCKS = {
+    'index.html': BASE_BLOCKS + (
+        'slider', 'facilities', 'headlines', 'about', 'call', 'classes', 'make_appointment', 'team', 'testimonial',
+    ),
+    'about.html': BASE_BLOCKS + ('about', 'headlines', 'team'),
+    'contact.html': BASE_BLOCKS + ('contact_us',),
+    'classes.html': BASE_BLOCKS + ('headlines', 'classes', 'make_appointment', 'testimonial'),
+    'join_us.html': BASE_BLOCKS + ('make_appointment',),
+    'schedule.html': BASE_BLOCKS + ('schedule',),
+    'manager.html': BASE_BLOCKS,
+    'login.html': BASE_BLOCKS,
+    'registration.html': BASE_BLOCKS,
+    'registration_done.html': BASE_BLOCKS,
+}
+
+
+def _get_builders(names):
+    """
+    Returns a callable without arguments for every requested context variable.
+    The site settings snapshot is loaded at most once no matter how many of its sections are requested.
+    """
+    site_settings = SimpleLazyObject(lambda: get_content({'site_settings': load_site_settings})['site_settings'])
+    builders = {}
+    for name in names:
+        if name in SECTIONS:
+            builders[name] = partial(getattr, site_settings, name)
+        elif name in CONTENT_BLOCKS:
+            builders[name] = partial(lambda block: get_content({block: CONTENT_BLOCKS[block]})[block], name)
+        else:
+            builders[name] = CONTEXT_BUILDERS[name]
+    return builders
 
 
 def get_common_context():
     """
-    Gets the common page context used across multiple pages of the site.
+    Gets the common page context used across multiple pages of the site, with every variable evaluated.
+    The content blocks come from the versioned content cache, the singletons (about, contacts, ...) from the site
+    settings snapshot, classes and gallery are random samples of the visible rows and the forms are always created
+    unbound.
     :return:
     """
-    return {
-        'slider': Slider.objects.filter(is_visible=True),
-        'team': Team.objects.all()[:3],
-        'about': About.objects.get(id=1),
-        'testimonial': Testimonial.objects.filter(is_visible=True),
-        'classes': Classes.objects.all().order_by('?')[:6],
-        'facilities': Facilities.objects.get(id=1),
-        'call': Call.objects.get(id=1),
-        'gallery': Gallery.objects.all().order_by('?')[:6],
-        'contacts': Contacts.objects.get(id=1),
-        'make_appointment': MakeAppointmentForm(),
-        'subscription': SubscriptionForm(),
-        'contact_us': ContactUsForm(),
-        'schedule': Schedule.objects.get(id=1),
-        'headlines': Headlines.objects.get(id=1),
-    }
-
-
-def get_page_context(request):
+    names = [*CONTENT_BLOCKS, *SECTIONS, *CONTEXT_BUILDERS]
+    names.remove('site_settings')
+    return {name: builder() for name, builder in _get_builders(names).items()}
+
+
+def get_page_context(request, template_name):
     """
     Gets the page context with the current request taken into account.
 
+    Only the variables declared for the template in PAGE_BLOCKS are added, and each of them is lazy: its query
+    runs only when the template touches it.
+
+    The 'user_manager' and 'user_auth' flags are added to every template by account.context_processors.roles.
+
+    Args:
+    - request: HttpRequest object.
+    - template_name: name of the rendered template, a key of PAGE_BLOCKS.
+
+    Returns:
+    - dictionary containing the lazy content variables declared for the template.
+    """
+    builders = _get_builders(PAGE_BLOCKS[template_name])
+    return {name: SimpleLazyObject(builder) for name, builder in builders.items()}
+
+
+async def aget_page_context(request, template_name):
+    """
+    Gets the page context of the async views (see main_page.async_views).
+
+    The content blocks and the site settings snapshot come from one aget_content call, and the random samples are
+    drawn at the same time with asyncio.gather. Unlike get_page_context, every variable is evaluated before
+    rendering, so the template itself never waits on the database.
+
     Args:
     - request: HttpRequest object.
+    - template_name: name of the rendered template, a key of PAGE_BLOCKS.
 
     Returns:
-    - tuple of two elements:
-        - dictionary containing data specific to the current request:
-            'user_manager': True if the user is in the 'manager' group, False otherwise.
-            'user_auth': True if the user is authenticated, False otherwise.
-        - dictionary containing the common page context obtained from the get_common_context function.
-    """
-    data = {
-        'user_manager': request.user.groups.filter(name='manager').exists(),
-        'user_auth': request.user.is_authenticated,
-    }
-    context = get_common_context()
-    data.update(context)
-    return data
+    - dictionary containing the content variables declared for the template.
+    """
+    names = PAGE_BLOCKS[template_name]
+    blocks = {name: ASYNC_CONTENT_BLOCKS[name] for name in names if name in CONTENT_BLOCKS}
+    if any(name in SECTIONS for name in names):
+        blocks['site_settings'] = ASYNC_CONTENT_BLOCKS['site_settings']
+    samples = [name for name in names if name in CONTEXT_BUILDERS and name not in POST_FORMS]
+
+    content, *sampled = await asyncio.gather(
+        aget_content(blocks), *(sync_to_async(CONTEXT_BUILDERS[name])() for name in samples),
+    )
+    context = dict(zip(samples, sampled))
+    for name in names:
+        if name in SECTIONS:
+            context[name] = getattr(content['site_settings'], name)
+        elif name in CONTENT_BLOCKS:
+            context[name] = content[name]
+        elif name in POST_FORMS:
+            context[name] = CONTEXT_BUILDERS[name]()
+    return context
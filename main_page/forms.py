@@ -16,6 +16,7 @@ Attributes:
     - MakeAppointmentForm (class): A Django ModelForm for making appointments.
     - SubscriptionForm (class): A Django ModelForm for subscribing to a service.
     - ContactUsForm (class): A Django ModelForm for contacting the website administrators.
+    - POST_FORMS (dict): The public forms keyed by the value of their hidden 'form_name' field.
 
 """
 
@@ -136,4 +137,11 @@ class ContactUsForm(forms.ModelForm):
 
     class Meta:
         model = ContactUs
-        fields = ['name', 'email', 'subject', 'message']
\ No newline at end of file
+        fields = ['name', 'email', 'subject', 'message']
+
+
+POST_FORMS = {
+    'make_appointment': MakeAppointmentForm,
+    'contact_us': ContactUsForm,
+    'subscription': SubscriptionForm,
+}
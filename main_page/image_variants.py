@@ -0,0 +1,130 @@
+"""
+Module containing the responsive image variants of the uploaded media.
+
+When a model with image fields is saved, every newly uploaded image is resized with Pillow to the widths of the
+IMAGE_VARIANT_WIDTHS setting (never upscaled) and stored as WebP and JPEG renditions with their dimensions in
+ImageVariant rows. The media_tags.responsive_image template tag turns them into srcset/sizes/width/height
+attributes; the build_image_variants management command backfills the existing media.
+
+Functions:
+- render_variants: resizes image bytes to all widths and formats; pure Pillow, safe to run in a process pool.
+- store_variants: saves rendered variants as ImageVariant rows, replacing the previous renditions of the source.
+- generate_variants: renders and stores the variants of one image of the media storage.
+- get_image_fields: returns the (model, field names) pairs of the models with uploaded images.
+- get_variants: returns the variants of all images, cached per content version.
+"""
+
+
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from PIL import Image, ImageOps
+
+from .content_cache import bump_content_version, get_content, get_content_version
+from .models import ImageVariant
+
+
+FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+
+_variants = (None, {})
+
+
+def render_variants(data, widths, quality):
+    """
+    Resizes an image to the given widths, keeping the aspect ratio, in every format of FORMATS.
+    Widths larger than the image are skipped; an image narrower than every width gets one rendition at its width.
+
+    Args:
+    - data: bytes of the original image.
+    - widths: iterable of target widths in pixels.
+    - quality: WebP/JPEG quality.
+
+    Returns:
+    - list of (width, height, format, bytes) tuples.
+    """
+    with Image.open(BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original).convert('RGB')
+
+    targets = sorted({width for width in widths if width <= image.width}) or [image.width]
+    rendered = []
+    for width in targets:
+        height = max(round(image.height * width / image.width), 1)
+        resized = image.resize((width, height), Image.Resampling.LANCZOS)
+        for name, pillow_format in FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, pillow_format, quality=quality)
+            rendered.append((width, height, name, buffer.getvalue()))
+    return rendered
+
+
+def store_variants(source, rendered):
+    """
+    Saves the rendered variants of an image, replacing its previous renditions.
+
+    Args:
+    - source: name of the original image in the media storage.
+    - rendered: the list returned by render_variants.
+    """
+    stem = source.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+    with transaction.atomic():
+        for variant in ImageVariant.objects.filter(source=source):
+            variant.image.delete(save=False)
+            variant.delete()
+        for width, height, name, data in rendered:
+            variant = ImageVariant(source=source, width=width, height=height, format=name)
+            variant.image.save(f'{stem}-{width}w.{name}', ContentFile(data), save=False)
+            variant.save()
+    bump_content_version()
+
+
+def generate_variants(source):
+    """
+    Renders and stores the variants of one image of the media storage.
+    :param source: name of the original image in the media storage
+    """
+    with default_storage.open(source) as original:
+        data = original.read()
+    store_variants(source, render_variants(data, settings.IMAGE_VARIANT_WIDTHS, settings.IMAGE_VARIANT_QUALITY))
+
+
+def get_image_fields():
+    """
+    Returns the models of the main_page app with uploaded images, except ImageVariant itself.
+    :return: list of (model, list of image field names) tuples
+    """
+    image_fields = []
+    for model in apps.get_app_config('main_page').get_models():
+        if model is ImageVariant:
+            continue
+        names = [field.name for field in model._meta.fields if isinstance(field, models.ImageField)]
+        if names:
+            image_fields.append((model, names))
+    return image_fields
+
+
+def _load_variants():
+    variants = {}
+    for source, width, height, name, image in ImageVariant.objects.values_list(
+            'source', 'width', 'height', 'format', 'image'):
+        variants.setdefault(source, []).append((width, height, name, default_storage.url(image)))
+    return variants
+
+
+def get_variants():
+    """
+    Returns the variants of all images with one query per content version. The result is also kept in the
+    process, so a page with many images reads the cache once.
+    :return: dict mapping the source name to a list of (width, height, format, url) tuples ordered by width
+    """
+    global _variants
+    version = get_content_version()
+    if _variants[0] != version:
+        _variants = (version, get_content({'image_variants': _load_variants})['image_variants'])
+    return _variants[1]
@@ -0,0 +1,92 @@
+"""
+Management command comparing the public pages served by gunicorn with sync WSGI workers (the Procfile) and by
+gunicorn with uvicorn ASGI workers running the async views, at the same number of workers.
+
+Usage:
+    python manage.py bench_asgi [--workers N] [--concurrency N] [--requests N] [--page-cache] [--output results.json]
+
+Both servers run against the same throwaway SQLite database loaded with data.json, so the configured database is
+never touched. The page cache is disabled unless --page-cache is given, otherwise both servers would mostly answer
+from the cache instead of rendering.
+"""
+
+
+import http.client
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main_page.benchmarks import run_gunicorn, server_environment, summarize
+
+
+URLS = ['/', '/about/', '/contacts/', '/classes/', '/join_us/', '/schedule/']
+
+SERVERS = {
+    'wsgi': ['d_site.wsgi'],
+    'asgi': ['d_site.asgi', '--worker-class', 'uvicorn.workers.UvicornWorker'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Compares requests/s and latency of the sync WSGI and the async ASGI public views under gunicorn.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn workers of both servers.')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent client connections.')
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per server.')
+        parser.add_argument('--page-cache', action='store_true', help='Keep the page cache enabled.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def _load(self, port, requests, concurrency):
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+
+        def client(count, offset):
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            samples = []
+            for i in range(count):
+                start = time.perf_counter()
+                connection.request('GET', URLS[(offset + i) % len(URLS)], headers={'Host': host})
+                response = connection.getresponse()
+                response.read()
+                samples.append(time.perf_counter() - start)
+                if response.status != 200:
+                    raise CommandError(f'Unexpected status {response.status}')
+            connection.close()
+            return samples
+
+        per_client = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+        # one round of every page per worker to import and compile everything before measuring
+        client(len(URLS) * 2, 0)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            samples = sum(executor.map(client, per_client, range(concurrency)), [])
+        elapsed = time.perf_counter() - start
+        return {'requests_per_second': round(len(samples) / elapsed, 1), **summarize(samples)}
+
+    def handle(self, *args, **options):
+        missing = [name for name in ('gunicorn', 'uvicorn') if find_spec(name) is None]
+        if missing:
+            raise CommandError(f'Install {" and ".join(missing)} to run the benchmark.')
+
+        results = {}
+        with server_environment() as env:
+            if not options['page_cache']:
+                env['PAGE_CACHE_TIMEOUT'] = '0'
+            for name, arguments in SERVERS.items():
+                server_env = {**env, 'ASYNC_VIEWS': '1' if name == 'asgi' else '0'}
+                with run_gunicorn([*arguments, '--workers', str(options['workers'])], server_env) as (port, _):
+                    results[name] = self._load(port, options['requests'], options['concurrency'])
+
+        for name, summary in results.items():
+            self.stdout.write(
+                f'{name}: {summary["requests_per_second"]} req/s, p50 {summary["p50_ms"]} ms, '
+                f'p95 {summary["p95_ms"]} ms, p99 {summary["p99_ms"]} ms'
+            )
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump({'workers': options['workers'], 'concurrency': options['concurrency'], **results},
+                          file, indent=2)
@@ -0,0 +1,118 @@
+"""
+Management command measuring what the warm-up boot mode of d_site/gunicorn.conf.py gains: the latency of the first
+requests every worker serves and the memory of each worker, with GUNICORN_WARMUP=0 (cold) and 1 (warm).
+
+Usage:
+    python manage.py bench_boot [--workers N] [--settle SECONDS] [--output results.json]
+
+Both servers run the Procfile configuration against the same throwaway SQLite database loaded with data.json.
+The memory is read from /proc/<pid>/smaps_rollup (Linux): RSS counts the shared pages in every worker, PSS splits
+them between the processes sharing them and USS is what only the worker itself holds.
+"""
+
+
+import http.client
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from main_page.benchmarks import run_gunicorn, server_environment, summarize
+from main_page.warmup import PUBLIC_PAGES
+
+
+def _children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as file:
+        return [int(child) for child in file.read().split()]
+
+
+def _memory_kb(pid):
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as file:
+        for line in file:
+            name, _, rest = line.partition(':')
+            if rest.strip().endswith('kB'):
+                values[name] = int(rest.split()[0])
+    return {
+        'rss_kb': values['Rss'],
+        'pss_kb': values['Pss'],
+        'uss_kb': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compares first-request latency and per-worker memory of the cold and warm gunicorn boot modes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='gunicorn workers.')
+        parser.add_argument('--settle', type=float, default=3.0,
+                            help='Seconds to wait after the workers are forked, so both modes have loaded the app.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def _round(self, port, paths, connections):
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+
+        def fetch(path):
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            start = time.perf_counter()
+            connection.request('GET', path, headers={'Host': host})
+            response = connection.getresponse()
+            response.read()
+            connection.close()
+            if response.status != 200:
+                raise CommandError(f'Unexpected status {response.status} for {path}')
+            return time.perf_counter() - start
+
+        with ThreadPoolExecutor(connections) as executor:
+            return list(executor.map(fetch, paths))
+
+    def _measure(self, env, workers, settle):
+        command = ['d_site.wsgi', '--config', 'd_site/gunicorn.conf.py', '--workers', str(workers)]
+        started = time.perf_counter()
+        with run_gunicorn(command, env) as (port, process):
+            while len(_children(process.pid)) < workers:
+                time.sleep(0.05)
+            forked = time.perf_counter() - started
+            time.sleep(settle)
+
+            # every worker's first requests: one of each public page per worker, as many connections as workers
+            paths = [reverse(name) for name in PUBLIC_PAGES] * workers
+            first = self._round(port, paths, workers)
+            for _ in range(5):
+                steady = self._round(port, paths, workers)
+
+            memory = [_memory_kb(pid) for pid in _children(process.pid)]
+            return {
+                'workers_forked_s': round(forked, 3),
+                'first_requests': summarize(first),
+                'first_request_max_ms': round(max(first) * 1000, 3),
+                'steady_requests': summarize(steady),
+                'master': _memory_kb(process.pid),
+                'worker_mean': {key: round(sum(m[key] for m in memory) / len(memory)) for key in memory[0]},
+            }
+
+    def handle(self, *args, **options):
+        if not os.path.exists('/proc/self/smaps_rollup'):
+            raise CommandError('/proc/<pid>/smaps_rollup is needed to measure the memory (Linux only).')
+
+        results = {}
+        with server_environment() as env:
+            for mode, warm_up in (('cold', '0'), ('warm', '1')):
+                results[mode] = self._measure({**env, 'GUNICORN_WARMUP': warm_up}, options['workers'],
+                                              options['settle'])
+
+        for mode, result in results.items():
+            worker = result['worker_mean']
+            self.stdout.write(
+                f'{mode}: forked in {result["workers_forked_s"]} s, first requests p50 '
+                f'{result["first_requests"]["p50_ms"]} ms / max {result["first_request_max_ms"]} ms, steady p50 '
+                f'{result["steady_requests"]["p50_ms"]} ms; per worker RSS {worker["rss_kb"]} kB, '
+                f'PSS {worker["pss_kb"]} kB, USS {worker["uss_kb"]} kB'
+            )
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump({'workers': options['workers'], **results}, file, indent=2)
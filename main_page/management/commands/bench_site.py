@@ -0,0 +1,249 @@
+"""
+Management command that load-tests every public and manager URL through the WSGI stack.
+
+Usage:
+    python manage.py bench_site [--scale N] [--requests N] [--concurrency N] [--no-page-cache]
+                                [--output results.json] [--baseline baseline.json [--tolerance 0.25]]
+
+data.json is loaded into a throwaway database (a temporary SQLite file when the configured database is SQLite,
+e.g. DATABASE_URL=sqlite:///db.sqlite3) and, with --scale, multiplied with synthetic rows. Every route of ROUTES is
+then measured twice:
+- one request at a time with tracemalloc on, for the queries and the peak allocated memory per request;
+- all routes mixed and sent from --concurrency threads, for the requests per second and p50/p95/p99 latency.
+
+With --baseline the results are compared with a saved run: more queries on any route, a p95 or a throughput worse
+than the tolerance is reported and the command exits with an error, which fails a CI job.
+"""
+
+
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import get_resolver, reverse
+
+from account.roles import MANAGER_GROUP
+from main_page.benchmarks import benchmark_database, summarize
+from main_page.content_cache import bump_content_version
+from main_page.models import Appointment, Classes, ContactUs, Gallery, Subscription, Testimonial
+
+
+Route = namedtuple('Route', 'name method url_name kwargs data client status')
+
+
+def route(name, url_name, method='GET', kwargs=None, data=None, client='anonymous', status=200):
+    return Route(name, method, url_name, kwargs or {}, data, client, status)
+
+
+# client: 'anonymous' and 'manager' clients are kept per thread, 'fresh' gets a new session for every request
+ROUTES = [
+    route('index', 'main_page:index'),
+    route('about', 'about'),
+    route('contacts', 'contacts'),
+    route('classes', 'classes'),
+    route('join_us', 'join_us'),
+    route('schedule', 'schedule'),
+    route('login_form', 'login_view'),
+    route('registration_form', 'registration_view'),
+    route('logout', 'logout_view', client='fresh', status=302),
+    route('manager_list', 'main_page:manager_list', client='manager'),
+    route('post_subscription', 'join_us', 'POST', status=303,
+          data=lambda i, ids: {'form_name': 'subscription', 'email': f'parent{i}@example.com'}),
+    route('post_contact_us', 'contacts', 'POST', status=303,
+          data=lambda i, ids: {'form_name': 'contact_us', 'name': 'Parent', 'email': f'parent{i}@example.com',
+                               'subject': 'Question', 'message': 'When does the new group start?'}),
+    route('post_appointment', 'main_page:index', 'POST', status=303,
+          data=lambda i, ids: {'form_name': 'make_appointment', 'name': 'Parent', 'email': f'parent{i}@example.com',
+                               'child_name': 'Child', 'child_age': '4', 'message': 'We would like to visit.'}),
+    route('post_login', 'login_view', 'POST', client='fresh', status=302,
+          data=lambda i, ids: {'username': 'bench-manager', 'password': 'bench-password-123'}),
+    route('post_registration', 'registration_view', 'POST', client='fresh',
+          data=lambda i, ids: {'username': f'bench-parent-{i}-{threading.get_ident()}',
+                               'password': 'bench-password-123', 'password2': 'bench-password-123'}),
+    route('post_process_requests', 'main_page:process_requests', 'POST', kwargs={'kind': 'appointment'},
+          client='manager', status=303, data=lambda i, ids: {'ids': ids}),
+]
+
+# URL names without a benchmark: the admin site, the uploaded media and the monitoring pages
+UNMEASURED = {'media', 'main_page:metrics', 'main_page:slow_queries'}
+
+SCALED_CONTENT = (Classes, Gallery, Testimonial)
+SYNTHETIC_REQUESTS = {
+    Appointment: lambda i: Appointment(name='Parent', email=f'parent{i}@example.com', child_name='Child',
+                                       child_age=4, message='We would like to visit.'),
+    ContactUs: lambda i: ContactUs(name='Parent', email=f'parent{i}@example.com', subject='Question',
+                                   message='When does the new group start?'),
+    Subscription: lambda i: Subscription(email=f'parent{i}@example.com'),
+}
+
+
+def _url_names(patterns=None, namespace=''):
+    names = set()
+    for pattern in patterns if patterns is not None else get_resolver().url_patterns:
+        if hasattr(pattern, 'url_patterns'):
+            if pattern.namespace != 'admin':
+                names |= _url_names(pattern.url_patterns, f'{namespace}{pattern.namespace}:' if pattern.namespace else namespace)
+        elif pattern.name:
+            names.add(namespace + pattern.name)
+    return names
+
+
+class Command(BaseCommand):
+    help = 'Load-tests every public and manager URL and compares the results with a saved baseline.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1,
+                            help='Multiply the content rows and add 1000 pending requests of each kind per step.')
+        parser.add_argument('--requests', type=int, default=50, help='Concurrent requests per route.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Client threads.')
+        parser.add_argument('--no-page-cache', action='store_true', help='Render every public page.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--baseline', help='Compare with the results JSON of an earlier run.')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed relative p95 latency and throughput regression (default: 0.25).')
+
+    def _scale(self, scale):
+        for model in SCALED_CONTENT:
+            rows = list(model.objects.values())
+            # the copies get positions after the existing ones, position is unique
+            step = max((row['position'] for row in rows), default=0)
+            copies = [
+                model(**{**row, 'id': None, 'position': row['position'] + step * copy})
+                for copy in range(1, scale) for row in rows
+            ]
+            model.objects.bulk_create(copies, batch_size=500)
+        for model, build in SYNTHETIC_REQUESTS.items():
+            model.objects.bulk_create([build(i) for i in range((scale - 1) * 1000)], batch_size=500)
+        bump_content_version()
+
+    def _setup(self):
+        user = get_user_model().objects.create_user('bench-manager', password='bench-password-123')
+        user.groups.add(Group.objects.get_or_create(name=MANAGER_GROUP)[0])
+        self.manager = user
+        self.pending_ids = [str(pk) for pk in Appointment.objects.filter(is_processed=False).values_list('pk', flat=True)[:20]]
+        self.counter = iter(range(10 ** 9))
+        self.local = threading.local()
+
+    def _client(self, kind):
+        if kind == 'fresh':
+            return Client()
+        if not hasattr(self.local, kind):
+            client = Client()
+            if kind == 'manager':
+                client.force_login(self.manager)
+            setattr(self.local, kind, client)
+        return getattr(self.local, kind)
+
+    def _request(self, item):
+        client = self._client(item.client)
+        path = reverse(item.url_name, kwargs=item.kwargs)
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            if item.method == 'POST':
+                response = client.post(path, item.data(next(self.counter), self.pending_ids))
+            else:
+                response = client.get(path)
+            elapsed = time.perf_counter() - start
+        return elapsed, len(queries), response.status_code == item.status
+
+    def _profile(self, item, repeat=5):
+        self._request(item)
+        queries, peaks = [], []
+        tracemalloc.start()
+        try:
+            for _ in range(repeat):
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                _, count, _ = self._request(item)
+                peaks.append(tracemalloc.get_traced_memory()[1] - before)
+                queries.append(count)
+        finally:
+            tracemalloc.stop()
+        return {'queries': round(sum(queries) / repeat, 2), 'peak_alloc_kb': round(sum(peaks) / repeat / 1024, 1)}
+
+    def _load(self, requests, concurrency):
+        jobs = [item for item in ROUTES for _ in range(requests)]
+        random.Random(0).shuffle(jobs)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            outcomes = list(executor.map(self._request, jobs))
+        elapsed = time.perf_counter() - start
+
+        by_route = {item.name: {'samples': [], 'errors': 0} for item in ROUTES}
+        for item, (latency, _, ok) in zip(jobs, outcomes):
+            by_route[item.name]['samples'].append(latency)
+            by_route[item.name]['errors'] += not ok
+        total = {'requests_per_second': round(len(jobs) / elapsed, 1), **summarize([o[0] for o in outcomes])}
+        routes = {name: {**summarize(values['samples']), 'errors': values['errors']} for name, values in by_route.items()}
+        return total, routes
+
+    def _compare(self, results, baseline, tolerance):
+        regressions = []
+        for name, current in results['routes'].items():
+            previous = baseline['routes'].get(name)
+            if previous is None:
+                continue
+            if current['queries'] > previous['queries']:
+                regressions.append(f'{name}: {previous["queries"]} -> {current["queries"]} queries per request')
+            if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+                regressions.append(f'{name}: p95 {previous["p95_ms"]} -> {current["p95_ms"]} ms')
+        previous_rps = baseline['total']['requests_per_second']
+        if results['total']['requests_per_second'] < previous_rps * (1 - tolerance):
+            regressions.append(f'total: {previous_rps} -> {results["total"]["requests_per_second"]} requests/s')
+        return regressions
+
+    def handle(self, *args, **options):
+        uncovered = _url_names() - {item.url_name for item in ROUTES} - UNMEASURED
+        if uncovered:
+            raise CommandError(f'Add the URLs {", ".join(sorted(uncovered))} to ROUTES of bench_site.')
+
+        overrides = {'THROTTLE_ENABLED': False}
+        if options['no_page_cache']:
+            overrides['PAGE_CACHE_TIMEOUT'] = 0
+
+        with tempfile.TemporaryDirectory() as directory:
+            with benchmark_database(['data.json'], sqlite_file=os.path.join(directory, 'bench.sqlite3')), \
+                    override_settings(FORM_SPOOL_DIR=os.path.join(directory, 'spool'), **overrides):
+                self._scale(options['scale'])
+                self._setup()
+                profiles = {item.name: self._profile(item) for item in ROUTES}
+                total, routes = self._load(options['requests'], options['concurrency'])
+
+        results = {
+            'meta': {
+                'scale': options['scale'], 'requests': options['requests'], 'concurrency': options['concurrency'],
+                'page_cache': not options['no_page_cache'], 'django': django.get_version(),
+            },
+            'total': total,
+            'routes': {name: {**profiles[name], **routes[name]} for name in routes},
+        }
+
+        for name, result in results['routes'].items():
+            self.stdout.write(
+                f'{name:24} p50 {result["p50_ms"]:8.2f} ms  p95 {result["p95_ms"]:8.2f} ms  p99 {result["p99_ms"]:8.2f} ms'
+                f'  {result["queries"]:5} queries  {result["peak_alloc_kb"]:8.1f} kB  {result["errors"]} errors'
+            )
+        self.stdout.write(f'total: {total["requests_per_second"]} requests/s, p95 {total["p95_ms"]} ms')
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                regressions = self._compare(results, json.load(file), options['tolerance'])
+            if regressions:
+                raise CommandError('Performance regressions:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
@@ -0,0 +1,78 @@
+"""
+Management command comparing the POST latency of the public forms with and without the write-behind queue.
+
+Usage:
+    python manage.py bench_submissions [--requests N] [--output results.json]
+
+Both modes post the same subscription, contact and appointment submissions through the WSGI stack to a
+throwaway database; the queued mode also reports how long draining the spool takes.
+"""
+
+
+import json
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from main_page.benchmarks import benchmark_database, summarize
+from main_page.models import Appointment, ContactUs, Subscription
+from main_page.submission_queue import drain_submissions
+
+
+SUBMISSIONS = [
+    {'form_name': 'subscription', 'email': 'parent@example.com'},
+    {'form_name': 'contact_us', 'name': 'Parent', 'email': 'parent@example.com', 'subject': 'Question',
+     'message': 'When does the new group start?'},
+    {'form_name': 'make_appointment', 'name': 'Parent', 'email': 'parent@example.com', 'child_name': 'Child',
+     'child_age': '4', 'message': 'We would like to visit.'},
+]
+
+
+class Command(BaseCommand):
+    help = 'Compares p50/p99 POST latency of the public forms with and without FORM_WRITE_BEHIND.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300, help='POST requests per mode.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def _run(self, requests):
+        client = Client()
+        samples = []
+        for i in range(requests):
+            data = SUBMISSIONS[i % len(SUBMISSIONS)]
+            start = time.perf_counter()
+            response = client.post('/join_us/', data)
+            samples.append(time.perf_counter() - start)
+            if response.status_code != 303:
+                raise RuntimeError(f'Unexpected status {response.status_code} for {data["form_name"]}')
+        return summarize(samples)
+
+    def handle(self, *args, **options):
+        results = {}
+        with benchmark_database(), tempfile.TemporaryDirectory() as spool_dir:
+            with override_settings(FORM_WRITE_BEHIND=False, THROTTLE_ENABLED=False):
+                results['direct'] = self._run(options['requests'])
+
+            with override_settings(FORM_WRITE_BEHIND=True, FORM_SPOOL_DIR=spool_dir, THROTTLE_ENABLED=False):
+                results['write_behind'] = self._run(options['requests'])
+                start = time.perf_counter()
+                inserted = drain_submissions(settings.FORM_SPOOL_BATCH_SIZE)
+                results['write_behind']['drain_s'] = round(time.perf_counter() - start, 3)
+                results['write_behind']['drained'] = inserted
+
+            rows = Appointment.objects.count() + ContactUs.objects.count() + Subscription.objects.count()
+            results['rows'] = rows
+
+        for mode in ('direct', 'write_behind'):
+            summary = results[mode]
+            self.stdout.write(f'{mode:>12}: p50 {summary["p50_ms"]} ms, p99 {summary["p99_ms"]} ms '
+                              f'over {summary["count"]} requests')
+        self.stdout.write(f'drained in {results["write_behind"]["drain_s"]} s, {results["rows"]} rows in total')
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
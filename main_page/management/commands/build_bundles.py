@@ -0,0 +1,24 @@
+"""
+Management command that builds the static asset bundles of main.html.
+
+Usage:
+    python manage.py collectstatic --noinput && python manage.py build_bundles
+
+Run it after collectstatic and before the web server starts, see main_page.bundles.
+"""
+
+
+from django.core.management.base import BaseCommand
+
+from main_page.bundles import build_bundles
+
+
+class Command(BaseCommand):
+    help = 'Concatenates, minifies, hashes and precompresses the CSS and JS bundles into STATIC_ROOT/bundles.'
+
+    def handle(self, *args, **options):
+        for name, (path, size, gzip_size, brotli_size) in build_bundles().items():
+            sizes = f'{size} bytes, gzip {gzip_size}'
+            if brotli_size is not None:
+                sizes += f', brotli {brotli_size}'
+            self.stdout.write(f'{name}: {path} ({sizes})')
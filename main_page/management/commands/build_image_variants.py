@@ -0,0 +1,72 @@
+"""
+Management command that generates the responsive variants of the already uploaded images.
+
+Usage:
+    python manage.py build_image_variants [--workers N] [--force]
+
+The images are resized in a process pool; the files and ImageVariant rows are written by the main process.
+New uploads get their variants when saved, see main_page.image_variants.
+"""
+
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from main_page.image_variants import get_image_fields, render_variants, store_variants
+from main_page.models import ImageVariant
+
+
+class Command(BaseCommand):
+    help = 'Generates the WebP/JPEG variants of the uploaded images that do not have them yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Resizing processes (default: CPUs).')
+        parser.add_argument('--force', action='store_true', help='Regenerate the variants of every image.')
+
+    def handle(self, *args, **options):
+        sources = set()
+        for model, names in get_image_fields():
+            for values in model.objects.values_list(*names):
+                sources.update(name for name in values if name)
+        if not options['force']:
+            sources -= set(ImageVariant.objects.values_list('source', flat=True))
+
+        pending = iter(sorted(sources))
+        generated = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            running = {}
+            while True:
+                while len(running) < options['workers'] * 2:
+                    source = next(pending, None)
+                    if source is None:
+                        break
+                    if not default_storage.exists(source):
+                        self.stderr.write(f'{source}: missing')
+                        failed += 1
+                        continue
+                    with default_storage.open(source) as original:
+                        data = original.read()
+                    future = executor.submit(
+                        render_variants, data, settings.IMAGE_VARIANT_WIDTHS, settings.IMAGE_VARIANT_QUALITY,
+                    )
+                    running[future] = source
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    source = running.pop(future)
+                    try:
+                        rendered = future.result()
+                    except Exception as error:
+                        self.stderr.write(f'{source}: {error}')
+                        failed += 1
+                        continue
+                    store_variants(source, rendered)
+                    generated += 1
+                    self.stdout.write(f'{source}: {len(rendered)} variants')
+
+        self.stdout.write(self.style.SUCCESS(f'{generated} images processed, {failed} failed'))
@@ -0,0 +1,35 @@
+"""
+Management command that inserts the form submissions spooled by the write-behind queue.
+
+Usage:
+    python manage.py drain_submissions [--batch-size N] [--loop [--interval SECONDS]]
+
+Run it on the host (or with the volume) that holds FORM_SPOOL_DIR, see main_page.submission_queue for the
+delivery guarantees.
+"""
+
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from main_page.submission_queue import drain_submissions
+
+
+class Command(BaseCommand):
+    help = 'Inserts the spooled Appointment, ContactUs and Subscription submissions with bulk_create.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Spool files per bulk_create batch (default: FORM_SPOOL_BATCH_SIZE).')
+        parser.add_argument('--loop', action='store_true', help='Keep draining until interrupted.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between drains with --loop.')
+
+    def handle(self, *args, **options):
+        while True:
+            inserted = drain_submissions(options['batch_size'])
+            for model_name, count in inserted.items():
+                self.stdout.write(f'{model_name}: {count} inserted')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
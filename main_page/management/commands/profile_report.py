@@ -0,0 +1,52 @@
+"""
+Management command that merges the cProfile captures of main_page.profiling and prints the hottest functions per view.
+
+Usage:
+    python manage.py profile_report [--dir PATH] [--view NAME ...] [--sort cumulative|tottime|calls] [--limit N]
+    python manage.py profile_report --token
+
+--token prints a signed token for the X-Profile-Token header (PROFILE_HEADER), which profiles the requests sending
+it for PROFILE_TOKEN_MAX_AGE seconds:
+    curl -H "X-Profile-Token: $(python manage.py profile_report --token)" https://example.com/classes/
+"""
+
+
+import pstats
+from io import StringIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main_page.profiling import get_profiles, make_profile_token
+
+
+class Command(BaseCommand):
+    help = 'Prints the hottest functions per view of the captured profiles.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='Profile directory (default: PROFILE_DIR).')
+        parser.add_argument('--view', action='append', help='Only this view, e.g. main_page.index; repeatable.')
+        parser.add_argument('--sort', choices=('cumulative', 'tottime', 'calls'), default='cumulative')
+        parser.add_argument('--limit', type=int, default=20, help='Functions printed per view.')
+        parser.add_argument('--token', action='store_true', help='Print a signed profiling token and exit.')
+
+    def handle(self, *args, **options):
+        if options['token']:
+            self.stdout.write(make_profile_token())
+            return
+
+        directory = options['dir'] or settings.PROFILE_DIR
+        profiles = get_profiles(directory)
+        if options['view']:
+            views = {view.replace(':', '.') for view in options['view']}
+            profiles = {view: paths for view, paths in profiles.items() if view in views}
+        if not profiles:
+            raise CommandError(f'No profiles in {directory}')
+
+        for view, paths in profiles.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{view}: {len(paths)} profiles'))
+            # pstats writes pieces of lines, which the command's output wrapper would end with newlines
+            report = StringIO()
+            stats = pstats.Stats(*map(str, paths), stream=report)
+            stats.strip_dirs().sort_stats(options['sort']).print_stats(options['limit'])
+            self.stdout.write(report.getvalue())
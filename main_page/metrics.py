@@ -0,0 +1,373 @@
+"""
+Module containing the request, database, form and login metrics of the site.
+
+Every process that serves requests counts in memory, and a background thread writes the counts to the file of the
+process in METRICS_DIR every METRICS_FLUSH_INTERVAL seconds when they changed, and when the process exits. The
+metrics view merges the files of all processes, so the gunicorn workers are aggregated whichever of them serves the
+scrape. The files of the exited processes are merged into one archive file (EXITED_FILE) at the next scrape, so their
+counts stay in the totals and the directory keeps one file per running process; d_site/gunicorn.conf.py clears the
+directory when gunicorn starts. The process ids tell which processes exited, so METRICS_DIR must be local to the
+host. The page cache and throttle counters of main_page.page_cache and main_page.throttle are written
+with the other counts.
+
+Metrics (Prometheus text format):
+- d_site_requests_total{view, method, status}: counter of the responses.
+- d_site_request_duration_seconds{view}: histogram of the response times.
+- d_site_db_queries_total{view}, d_site_db_query_seconds_total{view}: counters of the queries and their time.
+- d_site_form_submissions_total{model, result}: counter of the public form submissions, result is saved, spooled
+  (see main_page.submission_queue) or invalid.
+- d_site_logins_total{result}: counter of the logins, result is success or failure.
+- d_site_page_cache_total{result}: counter of the page cache hits and misses of the public pages.
+- d_site_throttle_total{scope, result}: counter of the allowed and throttled POST requests per scope.
+
+Functions:
+- increment: adds to a counter.
+- observe: records a value in a histogram.
+- flush_metrics: writes the counts of the current process to its file.
+- clear_metrics: forgets the counts of the current process and removes the files of all processes.
+- collect_metrics: merges the counts of all processes.
+- render_metrics: formats merged counts in the Prometheus text format.
+
+Classes:
+- MetricsMiddleware: records the responses, their times and queries per view.
+"""
+
+
+import atexit
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils.deprecation import MiddlewareMixin
+
+from .page_cache import get_page_cache_stats
+from .throttle import get_throttle_stats
+
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'd_site_'
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+EXITED_FILE = 'exited.json'
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_counters = Counter()
+_histograms = {}
+_process = {'file': None, 'dirty': False, 'flusher': None, 'baseline': Counter()}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def increment(name, value=1, **labels):
+    """
+    Adds to a counter of the current process.
+
+    Args:
+    - name: metric name without the prefix, e.g. 'requests_total'.
+    - value: the amount to add.
+    - labels: the label values of the counter.
+    """
+    with _lock:
+        _counters[_key(name, labels)] += value
+        _process['dirty'] = True
+
+
+def observe(name, value, **labels):
+    """
+    Records a value in a histogram of the current process with the DURATION_BUCKETS buckets.
+
+    Args:
+    - name: metric name without the prefix, e.g. 'request_duration_seconds'.
+    - value: the observed value.
+    - labels: the label values of the histogram.
+    """
+    with _lock:
+        histogram = _histograms.setdefault(_key(name, labels), [[0] * len(DURATION_BUCKETS), 0.0, 0])
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                histogram[0][index] += 1
+                break
+        histogram[1] += value
+        histogram[2] += 1
+        _process['dirty'] = True
+
+
+def _process_stats():
+    stats = Counter()
+    for result, value in get_page_cache_stats().items():
+        stats[_key('page_cache_total', {'result': result})] += value
+    for (scope, result), value in get_throttle_stats().items():
+        stats[_key('throttle_total', {'scope': scope, 'result': result})] += value
+    return stats
+
+
+def _snapshot():
+    with _lock:
+        counters = Counter(_counters)
+        histograms = {key: [list(buckets), total, count] for key, (buckets, total, count) in _histograms.items()}
+        _process['dirty'] = False
+    counters.update(_process_stats())
+    counters.subtract(_process['baseline'])
+    return _payload(counters, histograms)
+
+
+def _payload(counters, histograms):
+    return {
+        'counters': [[name, labels, value] for (name, labels), value in counters.items() if value],
+        'histograms': [[name, labels, *histogram] for (name, labels), histogram in histograms.items()],
+    }
+
+
+def _reset_process():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+    # a worker forked from the preloaded master inherits the page cache and throttle counts of the warm-up
+    with _flush_lock:
+        _process.update(file=None, dirty=False, baseline=_process_stats())
+
+
+def _after_fork():
+    global _lock, _flush_lock
+    # the locks may have been held by a thread of the parent when it forked
+    _lock = threading.Lock()
+    _flush_lock = threading.Lock()
+    _reset_process()
+    # the thread of the parent is not running in the child
+    _process['flusher'] = None
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _flush_periodically():
+    while True:
+        time.sleep(settings.METRICS_FLUSH_INTERVAL)
+        if _process['dirty']:
+            try:
+                flush_metrics()
+            except OSError:
+                logger.warning('Could not write the metrics', exc_info=True)
+
+
+def _start_flusher():
+    with _lock:
+        if _process['flusher'] is not None:
+            return
+        _process['flusher'] = threading.Thread(target=_flush_periodically, name='metrics-flusher', daemon=True)
+    _process['flusher'].start()
+
+
+def _write_json(path, data):
+    descriptor, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as tmp_file:
+            json.dump(data, tmp_file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def flush_metrics():
+    """
+    Writes the counts of the current process to its file in METRICS_DIR, replacing it atomically.
+    The flushes of the process (the flusher thread, the scrapes and the exit) are serialized.
+    """
+    with _flush_lock:
+        directory = Path(settings.METRICS_DIR)
+        # a new file also when METRICS_DIR changed since the last flush, e.g. by a test or a benchmark
+        if _process['file'] is None or _process['file'].parent != directory:
+            directory.mkdir(parents=True, exist_ok=True)
+            # a restarted worker may get the pid of an exited one, whose counts must be kept
+            _process['file'] = directory / f'{os.getpid()}-{time.time_ns()}.json'
+        _write_json(_process['file'], _snapshot())
+
+
+def _flush_at_exit():
+    # only the processes that flushed while serving requests, into the directory they used, if it still exists
+    if _process['file'] is not None and _process['file'].parent.is_dir():
+        flush_metrics()
+
+
+atexit.register(_flush_at_exit)
+
+
+def clear_metrics():
+    """
+    Forgets the counts of the current process and removes the files of all processes.
+    """
+    _reset_process()
+    for path in Path(settings.METRICS_DIR).glob('*.json'):
+        path.unlink(missing_ok=True)
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge(counters, histograms, data):
+    for name, labels, value in data['counters']:
+        counters[name, tuple(map(tuple, labels))] += value
+    for name, labels, buckets, total, count in data['histograms']:
+        merged = histograms.setdefault((name, tuple(map(tuple, labels))), [[0] * len(buckets), 0.0, 0])
+        merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+        merged[1] += total
+        merged[2] += count
+
+
+def _read_json(path):
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+
+
+def _archive_exited(directory):
+    """
+    Merges the files of the exited processes into the EXITED_FILE archive and removes them, so that their counts
+    stay in the totals while the number of files stays bounded. The archive lists the files merged into it, so a
+    file left behind by an interrupted run is not counted twice.
+    """
+    with open(directory / '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive = _read_json(directory / EXITED_FILE) or {'counters': [], 'histograms': [], 'merged': []}
+        archive['merged'] = [name for name in archive['merged'] if (directory / name).exists()]
+        exited = [
+            path for path in directory.glob('*-*.json')
+            if path.name.split('-', 1)[0].isdigit() and not _is_running(int(path.name.split('-', 1)[0]))
+        ]
+        if not exited:
+            return
+        counters = Counter()
+        histograms = {}
+        _merge(counters, histograms, archive)
+        for path in exited:
+            data = _read_json(path)
+            if path.name not in archive['merged'] and data is not None:
+                _merge(counters, histograms, data)
+                archive['merged'].append(path.name)
+        _write_json(directory / EXITED_FILE, {**_payload(counters, histograms), 'merged': archive['merged']})
+        for path in exited:
+            path.unlink(missing_ok=True)
+
+
+def collect_metrics():
+    """
+    Flushes the current process and merges the counts of all processes, archiving the files of the exited ones.
+    :return: tuple of the counters dict {(name, labels): value} and the histograms dict
+        {(name, labels): [bucket counts, sum, count]}, labels being tuples of (label, value) pairs
+    """
+    try:
+        flush_metrics()
+    except OSError:
+        logger.warning('Could not write the metrics of the process', exc_info=True)
+    directory = Path(settings.METRICS_DIR)
+    if not directory.is_dir():
+        return Counter(), {}
+    _archive_exited(directory)
+
+    counters = Counter()
+    histograms = {}
+    archive = _read_json(directory / EXITED_FILE) or {'counters': [], 'histograms': [], 'merged': []}
+    _merge(counters, histograms, archive)
+    for path in directory.glob('*-*.json'):
+        data = _read_json(path)
+        if data is not None and path.name not in archive['merged']:
+            _merge(counters, histograms, data)
+    return counters, histograms
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{label}="{value}"' for (label, _), value in zip(labels, escaped)) + '}'
+
+
+def render_metrics(counters, histograms):
+    """
+    Formats the merged counts in the Prometheus text exposition format.
+    :return: str
+    """
+    lines = []
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f'# TYPE {PREFIX}{name} counter')
+        for (_, labels), value in sorted(item for item in counters.items() if item[0][0] == name):
+            lines.append(f'{PREFIX}{name}{_format_labels(labels)} {value}')
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f'# TYPE {PREFIX}{name} histogram')
+        for (_, labels), (buckets, total, count) in sorted(item for item in histograms.items() if item[0][0] == name):
+            cumulative = 0
+            for bound, bucket in zip(DURATION_BUCKETS, buckets):
+                cumulative += bucket
+                lines.append(f'{PREFIX}{name}_bucket{_format_labels(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{PREFIX}{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {count}')
+            lines.append(f'{PREFIX}{name}_sum{_format_labels(labels)} {total}')
+            lines.append(f'{PREFIX}{name}_count{_format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+class _QueryCounter:
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.queries += 1
+
+
+class MetricsMiddleware(MiddlewareMixin):
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process_request(self, request):
+        request._metrics = (time.perf_counter(), _QueryCounter())
+        connection.execute_wrappers.append(request._metrics[1])
+
+    def process_response(self, request, response):
+        start, queries = getattr(request, '_metrics', (None, None))
+        if start is None:
+            return response
+        duration = time.perf_counter() - start
+        if queries in connection.execute_wrappers:
+            connection.execute_wrappers.remove(queries)
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        increment('requests_total', view=view, method=request.method, status=response.status_code)
+        observe('request_duration_seconds', duration, view=view)
+        if queries.queries:
+            increment('db_queries_total', queries.queries, view=view)
+            increment('db_query_seconds_total', queries.duration, view=view)
+        _start_flusher()
+        return response
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.7 on 2026-10-18 10:00
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_page', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Знімок налаштувань сайту',
+            },
+        ),
+    ]
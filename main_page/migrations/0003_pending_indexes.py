@@ -0,0 +1,25 @@
+# Generated by Django 4.1.7 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_page', '0002_sitesnapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['is_processed', '-date'], name='appointment_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactus',
+            index=models.Index(fields=['is_processed', '-date'], name='contactus_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['is_processed', '-date'], name='subscription_pending_idx'),
+        ),
+    ]
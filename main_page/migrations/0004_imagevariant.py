@@ -0,0 +1,32 @@
+# Generated by Django 4.1.7 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_page', '0003_pending_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(db_index=True, max_length=255)),
+                ('width', models.PositiveSmallIntegerField()),
+                ('height', models.PositiveSmallIntegerField()),
+                ('format', models.CharField(max_length=10)),
+                ('image', models.ImageField(upload_to='variants/')),
+            ],
+            options={
+                'verbose_name_plural': 'Варіанти зображень',
+                'ordering': ('source', 'width'),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='imagevariant',
+            constraint=models.UniqueConstraint(fields=('source', 'width', 'format'), name='imagevariant_unique_rendition'),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from .utils import get_file_name
 
@@ -342,6 +343,7 @@ class Appointment(models.Model):
     Meta:
         - ordering: Specifies the default ordering for records in the database table.
         - verbose_name_plural: Specifies the display name for the model in the admin interface.
+        - indexes: (is_processed, -date) index for the manager work list.
     """
     name = models.CharField(max_length=50)
     email = models.EmailField()
@@ -359,6 +361,9 @@ class Appointment(models.Model):
     class Meta:
         ordering = ('-date',)
         verbose_name_plural = 'Призначити зустріч'
+        indexes = [
+            models.Index(fields=['is_processed', '-date'], name='appointment_pending_idx'),
+        ]
 
 
 class Subscription(models.Model):
@@ -383,6 +388,7 @@ class Subscription(models.Model):
         In this case, the default ordering is by the date in descending order (i.e. latest subscriptions first).
         - verbose_name_plural: A string representing the human-readable plural name for the model.
         In this case, it is "Підписка на email розсилку".
+        - indexes: (is_processed, -date) index for the manager work list.
     """
     email = models.EmailField()
     date = models.DateField(auto_now_add=True )
@@ -395,6 +401,9 @@ class Subscription(models.Model):
     class Meta:
         ordering = ('-date',)
         verbose_name_plural = 'Підписка на email розсилку'
+        indexes = [
+            models.Index(fields=['is_processed', '-date'], name='subscription_pending_idx'),
+        ]
 
 
 class ContactUs(models.Model):
@@ -416,6 +425,7 @@ class ContactUs(models.Model):
     Meta:
         - ordering: a tuple that specifies the default ordering for instances of the model
         - verbose_name_plural: a string that specifies the plural name for the model in the admin interface
+        - indexes: (is_processed, -date) index for the manager work list
     """
 
     name = models.CharField(max_length=50)
@@ -433,6 +443,9 @@ class ContactUs(models.Model):
     class Meta:
         ordering = ('-date',)
         verbose_name_plural = "Зворотній зв'язок"
+        indexes = [
+            models.Index(fields=['is_processed', '-date'], name='contactus_pending_idx'),
+        ]
 
 
 class Headlines(models.Model):
@@ -509,3 +522,59 @@ class Schedule(models.Model):
         verbose_name_plural = 'Розклад занять'
 
 
+
+
+class SiteSnapshot(models.Model):
+    """
+    Defines a model called SiteSnapshot that keeps a denormalized copy of the site-wide singleton content
+    (About, Facilities, Call, Contacts, Schedule and Headlines), so that all of it is loaded in one query.
+    The snapshot is rebuilt whenever one of those models is saved or deleted (see main_page.snapshot).
+
+    Fields:
+        - payload: JSONField with the field values of every singleton row, keyed by the context variable name.
+        - updated: DateTimeField set to the time of the last rebuild.
+
+    Meta:
+        - verbose_name_plural: The plural name of the model, set to 'Знімок налаштувань сайту'.
+    """
+
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Знімок налаштувань сайту'
+
+
+class ImageVariant(models.Model):
+    """
+    Defines a model called ImageVariant that represents a resized rendition of an uploaded image
+    (see main_page.image_variants).
+
+    Fields:
+        - source: CharField with the name of the original image in the media storage.
+        - width: PositiveSmallIntegerField with the width of the rendition in pixels.
+        - height: PositiveSmallIntegerField with the height of the rendition in pixels.
+        - format: CharField with the format of the rendition, 'webp' or 'jpeg'.
+        - image: ImageField with the rendition file.
+
+    Meta:
+        - ordering: The renditions of an image are ordered by width.
+        - constraints: One rendition per source, width and format.
+        - verbose_name_plural: The plural name of the model, set to 'Варіанти зображень'.
+    """
+
+    source = models.CharField(max_length=255, db_index=True)
+    width = models.PositiveSmallIntegerField()
+    height = models.PositiveSmallIntegerField()
+    format = models.CharField(max_length=10)
+    image = models.ImageField(upload_to='variants/')
+
+    def __str__(self):
+        return f'{self.source} {self.width}w {self.format}'
+
+    class Meta:
+        ordering = ('source', 'width')
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'width', 'format'], name='imagevariant_unique_rendition'),
+        ]
+        verbose_name_plural = 'Варіанти зображень'
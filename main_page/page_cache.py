@@ -0,0 +1,118 @@
+"""
+Module containing the full-page cache for the public pages.
+
+Anonymous GET requests get the same HTML, so the rendered page is stored per (path, language, content version) in
+the cache selected by PAGE_CACHE_ALIAS. Because the key contains the content version (see
+main_page.content_cache), saving or deleting content purges every cached page. POST requests and authenticated
+users always reach the view.
+
+The CSRF token rendered in the forms is replaced by a placeholder before the page is stored and filled with the
+token of the current visitor when the page is served from the cache.
+
+Functions:
+- cache_public_page: view decorator that serves and stores pages for anonymous GET requests.
+- get_page_cache_stats: returns the hits and misses counted by the current process.
+"""
+
+
+import asyncio
+import re
+from collections import Counter
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.translation import get_language
+
+from .content_cache import get_content_version
+
+
+CSRF_TOKEN_RE = re.compile(rb'name="csrfmiddlewaretoken" value="[^"]*"')
+CSRF_PLACEHOLDER = b'name="csrfmiddlewaretoken" value="__csrf_token__"'
+
+_stats = Counter()
+
+
+def get_page_cache_stats():
+    """
+    Returns the page cache hits and misses counted by the current process.
+    :return: dict with the 'hits' and 'misses' keys
+    """
+    return {'hits': _stats['hits'], 'misses': _stats['misses']}
+
+
+def _make_key(request):
+    return f'page:{get_content_version()}:{get_language()}:{request.path}'
+
+
+def _cached_response(request, cached):
+    _stats['hits'] += 1
+    content, content_type = cached
+    token = f'name="csrfmiddlewaretoken" value="{get_token(request)}"'.encode()
+    response = HttpResponse(content.replace(CSRF_PLACEHOLDER, token), content_type=content_type)
+    response['X-Page-Cache'] = 'HIT'
+    return response
+
+
+def _cacheable_content(response):
+    """Returns what is stored for a rendered response, or None when it must not be cached."""
+    if response.status_code == 200 and not response.streaming:
+        return CSRF_TOKEN_RE.sub(CSRF_PLACEHOLDER, response.content), response['Content-Type']
+    return None
+
+
+def _is_anonymous_get(request):
+    return request.method == 'GET' and not request.user.is_authenticated
+
+
+def cache_public_page(view):
+    """
+    Caches the rendered page of the decorated view for anonymous GET requests.
+    The X-Page-Cache response header tells whether the page came from the cache (HIT) or was rendered (MISS).
+    Async views (see main_page.async_views) get an async wrapper using the async cache API.
+    """
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if not await sync_to_async(_is_anonymous_get)(request):
+                return await view(request, *args, **kwargs)
+
+            cache = caches[settings.PAGE_CACHE_ALIAS]
+            key = await sync_to_async(_make_key)(request)
+            cached = await cache.aget(key)
+            if cached is not None:
+                return _cached_response(request, cached)
+
+            _stats['misses'] += 1
+            response = await view(request, *args, **kwargs)
+            stored = _cacheable_content(response)
+            if stored is not None:
+                await cache.aset(key, stored, timeout=settings.PAGE_CACHE_TIMEOUT)
+            response['X-Page-Cache'] = 'MISS'
+            return response
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _is_anonymous_get(request):
+            return view(request, *args, **kwargs)
+
+        cache = caches[settings.PAGE_CACHE_ALIAS]
+        key = _make_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            return _cached_response(request, cached)
+
+        _stats['misses'] += 1
+        response = view(request, *args, **kwargs)
+        stored = _cacheable_content(response)
+        if stored is not None:
+            cache.set(key, stored, timeout=settings.PAGE_CACHE_TIMEOUT)
+        response['X-Page-Cache'] = 'MISS'
+        return response
+
+    return wrapper
@@ -0,0 +1,122 @@
+"""
+Module containing the on-demand cProfile capture of the views.
+
+A view runs under cProfile when its request is sampled (PROFILE_SAMPLE_RATE), carries a valid signed PROFILE_HEADER
+token (see make_profile_token) or is made by a staff user with the profile query flag (?profile). Each capture is
+written to PROFILE_DIR as '<view name>__<time>_<pid>.prof'; the directory keeps the newest PROFILE_MAX_FILES
+captures. manage.py profile_report merges the captures per view and prints the hottest functions.
+
+Functions:
+- make_profile_token: returns a signed token enabling the profiling of the requests sending it.
+- should_profile: tells whether a request is profiled.
+- save_profile: writes a capture and removes the oldest ones over the limit.
+- get_profiles: returns the captures of the profile directory grouped by view.
+
+Classes:
+- ProfilingMiddleware: runs the profiled views under cProfile.
+"""
+
+
+import asyncio
+import cProfile
+import os
+import random
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.deprecation import MiddlewareMixin
+
+
+SALT = 'main_page.profiling'
+QUERY_FLAG = 'profile'
+
+
+def make_profile_token():
+    """
+    Returns a token that enables the profiling of the requests sending it in the PROFILE_HEADER header,
+    valid for PROFILE_TOKEN_MAX_AGE seconds.
+    :return: str
+    """
+    return signing.TimestampSigner(salt=SALT).sign(QUERY_FLAG)
+
+
+def _valid_token(token):
+    try:
+        signing.TimestampSigner(salt=SALT).unsign(token, max_age=settings.PROFILE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def should_profile(request):
+    """
+    Tells whether a request is profiled: sampled, sent with a valid signed token or flagged by a staff user.
+    The user is only loaded for the requests with the query flag.
+    :param request: HttpRequest
+    :return: bool
+    """
+    if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+        return True
+    token = request.headers.get(settings.PROFILE_HEADER)
+    if token and _valid_token(token):
+        return True
+    return QUERY_FLAG in request.GET and request.user.is_staff
+
+
+def save_profile(profiler, view_name):
+    """
+    Writes a capture to PROFILE_DIR and removes the oldest captures over PROFILE_MAX_FILES.
+
+    Args:
+    - profiler: the cProfile.Profile of the view.
+    - view_name: the URL name of the view, namespaced names included.
+
+    Returns:
+    - Path of the written file.
+    """
+    directory = Path(settings.PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'{view_name.replace(":", ".")}__{time.time_ns()}_{os.getpid()}.prof'
+    profiler.dump_stats(path)
+
+    profiles = sorted(directory.glob('*.prof'), key=lambda profile: profile.stat().st_mtime_ns)
+    for profile in profiles[:-settings.PROFILE_MAX_FILES]:
+        profile.unlink(missing_ok=True)
+    return path
+
+
+def get_profiles(directory=None):
+    """
+    Returns the captures of the profile directory grouped by view.
+    :param directory: the directory, PROFILE_DIR by default
+    :return: dict mapping the view name to the list of its .prof paths
+    """
+    profiles = {}
+    for path in sorted(Path(directory or settings.PROFILE_DIR).glob('*__*.prof')):
+        profiles.setdefault(path.name.rsplit('__', 1)[0], []).append(path)
+    return profiles
+
+
+class ProfilingMiddleware(MiddlewareMixin):
+    """
+    Must be the last middleware: the view is called here, so the process_view of the middleware below it
+    (the CSRF check) would be skipped for the profiled requests. The async views are not profiled.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if asyncio.iscoroutinefunction(view_func) or not should_profile(request):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(view_func, request, *view_args, **view_kwargs)
+        finally:
+            match = request.resolver_match
+            save_profile(profiler, match.view_name if match else request.path.strip('/').replace('/', '.'))
@@ -0,0 +1,163 @@
+"""
+Module containing the query budgets of the views.
+
+Every view has a maximum number of queries per request and a maximum number of duplicate queries, i.e. queries that
+repeat an earlier query of the same request with other parameters, which is how an N+1 in a template include shows
+up. The budgets are declared in QUERY_BUDGETS, keyed by the view name of the URLconf, and measured with an empty
+cache (the most expensive request). They are enforced by the tests in main_page.tests and, with
+QUERY_BUDGET_CHECKS on, at runtime by QueryBudgetMiddleware, which logs the stack traces of the offending queries.
+
+Attributes:
+- QUERY_BUDGETS: the budget of each view name.
+
+Classes:
+- QueryBudget: maximum queries and duplicate queries of a view.
+- QueryBudgetMiddleware: debug middleware checking every request against the budget of its view.
+
+Functions:
+- normalize_sql: replaces the literals of a query so that queries differing only in parameters compare equal.
+- count_duplicates: returns the number of queries repeating an earlier query.
+- check_budget: returns the budget violations of a request.
+- rendering_templates: returns the names of the templates being rendered by the current stack.
+"""
+
+
+import logging
+import re
+import sys
+import traceback
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+
+logger = logging.getLogger(__name__)
+
+QueryBudget = namedtuple('QueryBudget', 'max_queries max_duplicates', defaults=(0,))
+
+# Measured with an empty cache for a manager, whose session, user and role lookups and session save add 4 queries
+# to the anonymous requests. Transaction statements (BEGIN, SAVEPOINT, ...) are not counted.
+QUERY_BUDGETS = {
+    'main_page:index': QueryBudget(13),
+    'about': QueryBudget(9),
+    'contacts': QueryBudget(8),
+    'classes': QueryBudget(11),
+    'join_us': QueryBudget(8),
+    'schedule': QueryBudget(8),
+    'login_view': QueryBudget(8),
+    'registration_view': QueryBudget(8),
+    'logout_view': QueryBudget(4),
+    'main_page:manager_list': QueryBudget(12),
+    'main_page:process_requests': QueryBudget(5),
+}
+
+SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+SQL_IN_LISTS = re.compile(r'\bIN \((?:\?|%s|, )+\)', re.I)
+TRANSACTION_STATEMENTS = re.compile(r'^\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE SAVEPOINT)\b', re.I)
+
+
+def normalize_sql(sql):
+    """
+    Replaces the string and number literals and the IN lists of a query with placeholders.
+    :param sql: str, SQL of an executed query
+    :return: str
+    """
+    return SQL_IN_LISTS.sub('IN (...)', SQL_LITERALS.sub('?', sql))
+
+
+def count_duplicates(queries):
+    """
+    Counts the queries that repeat an earlier query of the list with other (or the same) parameters.
+    :param queries: iterable of SQL strings
+    :return: int
+    """
+    seen = set()
+    duplicates = 0
+    for sql in queries:
+        normalized = normalize_sql(sql)
+        duplicates += normalized in seen
+        seen.add(normalized)
+    return duplicates
+
+
+def check_budget(view_name, queries):
+    """
+    Checks the queries of one request against the budget of its view.
+
+    Args:
+    - view_name: view name of the resolved URL, a key of QUERY_BUDGETS.
+    - queries: list of the SQL strings executed by the request.
+
+    Returns:
+    - list of violation messages, empty when the request is within budget or the view has no budget.
+    """
+    budget = QUERY_BUDGETS.get(view_name)
+    if budget is None:
+        return []
+    queries = [sql for sql in queries if not TRANSACTION_STATEMENTS.match(sql)]
+    violations = []
+    if len(queries) > budget.max_queries:
+        violations.append(f'{view_name}: {len(queries)} queries, the budget is {budget.max_queries}')
+    duplicates = count_duplicates(queries)
+    if duplicates > budget.max_duplicates:
+        violations.append(f'{view_name}: {duplicates} duplicate queries, the budget is {budget.max_duplicates}')
+    return violations
+
+
+def rendering_templates():
+    """Returns the names of the templates being rendered by the current stack, outermost first."""
+    names = []
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_code is Template._render.__code__:
+            names.append(frame.f_locals['self'].origin.template_name)
+        frame = frame.f_back
+    return names[::-1]
+
+
+class QueryBudgetMiddleware:
+    """
+    Records the queries of every request with the stack and the templates that executed them and logs a warning with
+    the stack traces of the repeated queries when the request exceeds the budget of its view. Only installed with QUERY_BUDGET_CHECKS
+    on, as recording a stack per query is slow.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_CHECKS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append((sql, traceback.extract_stack()[:-1], rendering_templates()))
+            return execute(sql, params, many, context)
+
+        with connections['default'].execute_wrapper(record):
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        violations = check_budget(match.view_name, [sql for sql, _, _ in queries]) if match else []
+        if violations:
+            logger.warning('Query budget exceeded: %s\n%s', '; '.join(violations), self._format(queries))
+        return response
+
+    @staticmethod
+    def _format(queries):
+        seen = set()
+        lines = []
+        for sql, stack, templates in queries:
+            if TRANSACTION_STATEMENTS.match(sql):
+                continue
+            normalized = normalize_sql(sql)
+            if normalized in seen:
+                frames = [frame for frame in stack if str(settings.BASE_DIR) in frame.filename]
+                lines.append(f'Repeated query: {sql}\n'
+                             f'Templates: {" > ".join(map(str, templates)) or "-"}\n'
+                             + ''.join(traceback.format_list(frames)))
+            seen.add(normalized)
+        return '\n'.join(lines)
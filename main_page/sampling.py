@@ -0,0 +1,40 @@
+"""
+Module containing the random sampling of visible content rows.
+
+Instead of ORDER BY RAND(), which sorts the whole table on every request, the primary keys of the visible rows are
+kept in the content cache (see main_page.content_cache) and refreshed together with the rest of the content when a
+model is saved or deleted. A sample is drawn from that pool in Python and loaded with a single pk__in query, which
+checks the visibility again, so the cost does not depend on the table size.
+
+Functions:
+- sample_visible: returns k random visible objects of a queryset's model.
+"""
+
+
+import random
+
+from .content_cache import get_content
+
+
+def _get_visible_ids(model):
+    name = f'visible_ids:{model._meta.label_lower}'
+    builders = {name: lambda: list(model.objects.filter(is_visible=True).values_list('pk', flat=True))}
+    return get_content(builders)[name]
+
+
+def sample_visible(queryset, k):
+    """
+    Returns k random visible objects, or all visible objects when there are fewer than k.
+
+    Args:
+    - queryset: QuerySet used to load the sampled objects; it may declare select_related/prefetch_related.
+    - k: the number of objects to return.
+
+    Returns:
+    - list of model instances in random order.
+    """
+    pool = _get_visible_ids(queryset.model)
+    ids = random.sample(pool, min(k, len(pool)))
+    # the pool may predate a row being hidden, see CONTENT_VERSION_MAX_AGE
+    objects = queryset.filter(is_visible=True).in_bulk(ids)
+    return [objects[pk] for pk in ids if pk in objects]
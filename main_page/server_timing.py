@@ -0,0 +1,161 @@
+"""
+Module containing the per-request performance instrumentation.
+
+For a sampled fraction of the requests (SERVER_TIMING_SAMPLE_RATE, 0 disables the middleware completely) the
+middleware measures the database queries (count and time, through a connection execute wrapper), the render time of
+every template including the includes of the page, the view and the whole request. The measurements are logged as
+one JSON line per request by the 'main_page.server_timing' logger and, for staff users only, sent in the
+Server-Timing response header shown by the browser developer tools, as they reveal the templates and the database
+load of the site.
+
+Template render times are measured by a wrapper of Template._render installed while at least one sampled request is
+being measured (see timed_templates) and removed after the last one, so the requests that are not sampled and the
+processes without the middleware render the templates unwrapped.
+
+Template render times are inclusive: the time of main.html contains the time of the templates it includes, and a
+template rendered several times (an include in a loop) reports the sum.
+
+Functions:
+- timed_templates: context manager that measures the render times of the templates while it is entered.
+
+Classes:
+- RequestTimings: the measurements of one request.
+- ServerTimingMiddleware: samples the requests and emits their measurements.
+"""
+
+
+import json
+import logging
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.template.base import Template
+
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('server_timing', default=None)
+_lock = threading.Lock()
+_hook = {'users': 0, 'render': None}
+
+
+class RequestTimings:
+    __slots__ = ('db_queries', 'db_time', 'templates', 'view_start', 'view_time')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.templates = {}
+        self.view_start = None
+        self.view_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.db_queries += 1
+
+
+def _timed_render(self, context):
+    render = _hook['render']
+    timings = _current.get()
+    if timings is None:
+        return render(self, context)
+    start = time.perf_counter()
+    try:
+        return render(self, context)
+    finally:
+        name = self.origin.template_name or '<string>'
+        timings.templates[name] = timings.templates.get(name, 0.0) + time.perf_counter() - start
+
+
+@contextmanager
+def timed_templates(timings):
+    """
+    Adds the render times of the templates rendered in the current context to timings while entered. The wrapper of
+    Template._render is installed by the first of the concurrent users and the previous method restored by the last.
+    :param timings: RequestTimings
+    """
+    with _lock:
+        if not _hook['users']:
+            _hook['render'] = Template._render
+            Template._render = _timed_render
+        _hook['users'] += 1
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+        with _lock:
+            _hook['users'] -= 1
+            if not _hook['users']:
+                Template._render = _hook['render']
+
+
+def _metric_name(template_name):
+    return 'tpl-' + re.sub(r'[^A-Za-z0-9_.-]', '-', str(template_name))
+
+
+class ServerTimingMiddleware:
+
+    def __init__(self, get_response):
+        if settings.SERVER_TIMING_SAMPLE_RATE <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.SERVER_TIMING_SAMPLE_RATE
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        start = time.perf_counter()
+        with timed_templates(timings), connection.execute_wrapper(timings):
+            response = self.get_response(request)
+        end = time.perf_counter()
+        total = end - start
+        if timings.view_start is not None:
+            timings.view_time = end - timings.view_start
+
+        metrics = [
+            ('db', timings.db_time, f'{timings.db_queries} queries'),
+            *((_metric_name(name), duration, None) for name, duration in timings.templates.items()),
+            ('view', timings.view_time, None),
+            ('total', total, None),
+        ]
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            response['Server-Timing'] = ', '.join(
+                f'{name};dur={duration * 1000:.1f}' + (f';desc="{desc}"' if desc else '')
+                for name, duration, desc in metrics
+            )
+        match = request.resolver_match
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'view_ms': round(timings.view_time * 1000, 2),
+            'db_queries': timings.db_queries,
+            'db_ms': round(timings.db_time * 1000, 2),
+            'templates_ms': {name: round(duration * 1000, 2) for name, duration in timings.templates.items()},
+        }))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = _current.get()
+        if timings is None:
+            return None
+        # the view time runs from here to the response, including the page cache and the inner middleware
+        timings.view_start = time.perf_counter()
+        return None
@@ -0,0 +1,66 @@
+"""
+Module containing the signal receivers of the main_page app.
+
+Saving or deleting any model rendered on the public pages starts a new content version, which invalidates the
+content cached by main_page.content_cache. Changes to the site-wide singletons rebuild the site settings snapshot
+first (see main_page.snapshot). Newly uploaded images get their resized variants (see main_page.image_variants).
+The login outcomes are counted by main_page.metrics.
+"""
+
+
+import logging
+
+from django.contrib.auth.signals import user_logged_in, user_login_failed
+from django.db.models.signals import post_save, post_delete
+
+from .content_cache import bump_content_version
+from .image_variants import generate_variants, get_image_fields
+from .metrics import increment
+from .models import ImageVariant, Slider, Team, About, Testimonial, Classes, Facilities, Call, Gallery, Contacts, Schedule, Headlines
+from .snapshot import SNAPSHOT_MODELS, build_site_snapshot
+
+
+logger = logging.getLogger(__name__)
+
+CONTENT_MODELS = (Slider, Team, About, Testimonial, Classes, Facilities, Call, Gallery, Contacts, Schedule, Headlines)
+
+
+def invalidate_content(sender, **kwargs):
+    if sender in SNAPSHOT_MODELS:
+        build_site_snapshot()
+    bump_content_version()
+
+
+for model in CONTENT_MODELS:
+    post_save.connect(invalidate_content, sender=model, dispatch_uid=f'invalidate_content_save_{model.__name__}')
+    post_delete.connect(invalidate_content, sender=model, dispatch_uid=f'invalidate_content_delete_{model.__name__}')
+
+
+def generate_image_variants(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    sources = {file.name for file in (getattr(instance, name) for name in IMAGE_FIELDS[sender]) if file}
+    existing = set(ImageVariant.objects.filter(source__in=sources).values_list('source', flat=True))
+    for source in sources - existing:
+        try:
+            generate_variants(source)
+        except Exception:
+            logger.exception('Could not generate the variants of %s', source)
+
+
+IMAGE_FIELDS = dict(get_image_fields())
+
+for model in IMAGE_FIELDS:
+    post_save.connect(generate_image_variants, sender=model, dispatch_uid=f'image_variants_{model.__name__}')
+
+
+def count_login(sender, **kwargs):
+    increment('logins_total', result='success')
+
+
+def count_failed_login(sender, **kwargs):
+    increment('logins_total', result='failure')
+
+
+user_logged_in.connect(count_login, dispatch_uid='metrics_login')
+user_login_failed.connect(count_failed_login, dispatch_uid='metrics_failed_login')
@@ -0,0 +1,170 @@
+"""
+Module containing the slow query log.
+
+SlowQueryMiddleware times every query of a request. A query slower than SLOW_QUERY_THRESHOLD_MS is captured with the
+view of the request, the project frames of the stack that executed it, the templates being rendered and, for a
+SELECT, its plan: EXPLAIN (MySQL, PostgreSQL) or EXPLAIN QUERY PLAN (SQLite) run on the same connection with the
+same parameters. The captures keep the SQL with its placeholders, never the parameters, which hold session keys,
+password hashes and the personal data of the forms; the queries of SENSITIVE_TABLES are not explained either, as a
+PostgreSQL plan shows the parameters in its conditions. The captures are logged as warnings and kept in a ring
+buffer of the last SLOW_QUERY_BUFFER_SIZE captures of the process, which the slow_queries view shows to staff users
+and exports as JSON lines. With several gunicorn workers the buffer is the one of the worker serving the view, the
+log has the captures of all of them.
+
+Functions:
+- explain: returns the plan of a query.
+- get_captures: returns the captures of the ring buffer, newest first.
+- clear_captures: empties the ring buffer.
+
+Classes:
+- SlowQueryMiddleware: captures the slow queries of every request.
+"""
+
+
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connection
+from django.utils.deprecation import MiddlewareMixin
+
+from .query_budget import rendering_templates
+
+
+logger = logging.getLogger(__name__)
+
+SELECT = re.compile(r'^\s*(\(\s*)*(SELECT|WITH)\b', re.I)
+SENSITIVE_TABLES = re.compile(r'\b(django_session|auth_user)\b', re.I)
+STACK_DEPTH = 8
+# the execute wrappers of the other instrumentation middleware, which are on the stack of every query
+INSTRUMENTATION_FILES = {
+    os.path.join(os.path.dirname(__file__), f'{module}.py')
+    for module in ('metrics', 'query_budget', 'server_timing', 'slow_queries')
+}
+
+_lock = threading.Lock()
+_captures = deque()
+
+
+def explain(db_connection, sql, params):
+    """
+    Returns the plan of a query, run on a backend cursor so that the EXPLAIN itself is not timed or captured.
+
+    Args:
+    - db_connection: the database connection that executed the query.
+    - sql: SQL of the query with the placeholders of the backend.
+    - params: the parameters of the query.
+
+    Returns:
+    - list of the plan rows, each a dict of the column names and values.
+
+    Raises:
+    - DatabaseError: the backend cannot explain the query.
+    """
+    with db_connection.wrap_database_errors:
+        cursor = db_connection.create_cursor()
+        try:
+            cursor.execute(f'{db_connection.ops.explain_query_prefix()} {sql}', params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, map(str, row))) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+
+def _stack():
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if str(settings.BASE_DIR) in frame.filename and 'site-packages' not in frame.filename
+        and frame.filename not in INSTRUMENTATION_FILES
+    ]
+    return [f'{frame.filename}:{frame.lineno} in {frame.name}' for frame in frames[-STACK_DEPTH:]]
+
+
+def _store(capture):
+    global _captures
+    with _lock:
+        if _captures.maxlen != settings.SLOW_QUERY_BUFFER_SIZE:
+            _captures = deque(_captures, maxlen=settings.SLOW_QUERY_BUFFER_SIZE)
+        _captures.append(capture)
+
+
+def get_captures():
+    """
+    Returns the captured slow queries of the process, newest first.
+    :return: list of dicts with the time, view, method, path, duration_ms, sql, stack, templates, plan and plan_error
+        keys
+    """
+    with _lock:
+        return list(reversed(_captures))
+
+
+def clear_captures():
+    """
+    Empties the ring buffer of the process.
+    """
+    with _lock:
+        _captures.clear()
+
+
+class _SlowQueryRecorder:
+
+    def __init__(self, request):
+        self.request = request
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            if duration >= settings.SLOW_QUERY_THRESHOLD_MS:
+                self.capture(context['connection'], sql, params, many, duration)
+
+    def capture(self, db_connection, sql, params, many, duration):
+        match = self.request.resolver_match
+        capture = {
+            'time': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+            'view': match.view_name if match else None,
+            'method': self.request.method,
+            'path': self.request.path,
+            'duration_ms': round(duration, 2),
+            'sql': sql,
+            'stack': _stack(),
+            'templates': rendering_templates(),
+            'plan': [],
+            'plan_error': None,
+        }
+        if SENSITIVE_TABLES.search(sql):
+            capture['plan_error'] = 'Not explained: the plan may show the parameters of a sensitive table.'
+        elif not many and SELECT.match(sql):
+            try:
+                capture['plan'] = explain(db_connection, sql, params)
+            except DatabaseError as error:
+                capture['plan_error'] = str(error)
+        _store(capture)
+        logger.warning('Slow query (%.1f ms) in %s: %s', duration, capture['view'], sql)
+
+
+class SlowQueryMiddleware(MiddlewareMixin):
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_LOG:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process_request(self, request):
+        request._slow_query_recorder = _SlowQueryRecorder(request)
+        connection.execute_wrappers.append(request._slow_query_recorder)
+
+    def process_response(self, request, response):
+        recorder = getattr(request, '_slow_query_recorder', None)
+        if recorder in connection.execute_wrappers:
+            connection.execute_wrappers.remove(recorder)
+        return response
@@ -0,0 +1,134 @@
+"""
+Module containing the site settings snapshot.
+
+About, Facilities, Call, Contacts, Schedule and Headlines are site-wide singletons (the row with id=1). Instead of
+one query per model, their field values are denormalized into a single SiteSnapshot row that is rebuilt when one
+of them is saved or deleted, and loaded with one query into immutable objects the templates consume directly.
+
+Classes:
+- ImageRef: an uploaded image of a snapshot section, exposing name and url like a FieldFile.
+- Section: the read-only field values of one singleton row.
+- SiteSettings: all sections of the snapshot.
+
+Functions:
+- build_site_snapshot: reads the singleton rows and stores them in the SiteSnapshot row.
+- load_site_settings: loads the snapshot in one query, building it first when it does not exist yet.
+"""
+
+
+from django.core.files.storage import default_storage
+from django.db.models import FileField
+
+from .models import About, Facilities, Call, Contacts, Schedule, Headlines, SiteSnapshot
+
+
+SECTIONS = {
+    'about': About,
+    'facilities': Facilities,
+    'call': Call,
+    'contacts': Contacts,
+    'schedule': Schedule,
+    'headlines': Headlines,
+}
+SNAPSHOT_MODELS = tuple(SECTIONS.values())
+SINGLETON_ID = 1
+SNAPSHOT_ID = 1
+
+
+class ImageRef:
+    __slots__ = ('name', 'url')
+
+    def __init__(self, name):
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'url', default_storage.url(name) if name else '')
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+    def __reduce__(self):
+        return self.__class__, (self.name,)
+
+    def __bool__(self):
+        return bool(self.name)
+
+    def __str__(self):
+        return self.name
+
+
+class Section:
+    __slots__ = ('_values',)
+
+    def __init__(self, values):
+        object.__setattr__(self, '_values', dict(values))
+
+    def __getattr__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+    def __reduce__(self):
+        return self.__class__, (self._values,)
+
+
+class SiteSettings:
+    __slots__ = tuple(SECTIONS)
+
+    def __init__(self, sections):
+        for name in SECTIONS:
+            object.__setattr__(self, name, sections.get(name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+    def __reduce__(self):
+        return self.__class__, ({name: getattr(self, name) for name in SECTIONS},)
+
+    @classmethod
+    def from_payload(cls, payload):
+        sections = {}
+        for name, model in SECTIONS.items():
+            values = payload.get(name)
+            if values is None:
+                continue
+            values = dict(values)
+            for field in model._meta.concrete_fields:
+                if isinstance(field, FileField) and field.attname in values:
+                    values[field.attname] = ImageRef(values[field.attname])
+            sections[name] = Section(values)
+        return cls(sections)
+
+
+def _serialize(instance):
+    values = {}
+    for field in instance._meta.concrete_fields:
+        value = field.value_from_object(instance)
+        values[field.attname] = value.name if isinstance(field, FileField) else value
+    return values
+
+
+def build_site_snapshot():
+    """
+    Reads the singleton rows and stores their field values in the SiteSnapshot row.
+    :return: dict, the stored payload
+    """
+    payload = {}
+    for name, model in SECTIONS.items():
+        instance = model.objects.filter(id=SINGLETON_ID).first()
+        payload[name] = _serialize(instance) if instance is not None else None
+    SiteSnapshot.objects.update_or_create(id=SNAPSHOT_ID, defaults={'payload': payload})
+    return payload
+
+
+def load_site_settings():
+    """
+    Loads the site settings snapshot with one query.
+    :return: SiteSettings
+    """
+    payload = SiteSnapshot.objects.filter(id=SNAPSHOT_ID).values_list('payload', flat=True).first()
+    if payload is None:
+        payload = build_site_snapshot()
+    return SiteSettings.from_payload(payload)
@@ -0,0 +1,69 @@
+"""
+Module containing the content-addressed storage of the uploaded media.
+
+Uploaded files are named by the hash of their content instead of a random name: the directory chosen by upload_to
+(see main_page.utils.get_file_name) is kept and the file name is replaced by the hash, so uploading the same photo
+again reuses the stored file, and a file name never changes its content. The latter is what lets the media be
+served with immutable cache headers, see main_page.views.serve_media.
+
+Classes:
+- ContentAddressedStorage: FileSystemStorage naming files by the SHA-256 of their content.
+"""
+
+
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+HASH_LENGTH = 32
+HASHED_NAME = re.compile(rf'^[0-9a-f]{{{HASH_LENGTH}}}$')
+
+
+def content_hash(content):
+    """
+    Hashes a file in chunks, leaving it at the start.
+    :param content: File object
+    :return: str, the first HASH_LENGTH hex digits of its SHA-256
+    """
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def is_hashed_name(name):
+    """
+    Tells whether a stored file is named by its content hash.
+    :param name: name of the file in the storage
+    :return: bool
+    """
+    return bool(HASHED_NAME.match(os.path.splitext(os.path.basename(name))[0]))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that names every saved file '<upload_to directory>/<content hash>.<extension>'.
+    Saving content that is already stored returns the existing name without writing the file again.
+
+    Files may be shared by several rows, so they must not be deleted while a row still refers to them.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(directory, content_hash(content) + extension).replace('\\', '/')
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
@@ -0,0 +1,136 @@
+"""
+Module containing the optional write-behind queue for the public form submissions.
+
+With FORM_WRITE_BEHIND enabled, a validated Appointment, ContactUs or Subscription submission is not inserted in
+the request: it is written as one JSON file into the FORM_SPOOL_DIR spool directory and the request returns. The
+drain_submissions management command reads the spool and inserts the submissions with bulk_create in batches of
+FORM_SPOOL_BATCH_SIZE.
+
+Delivery guarantees:
+- durable once enqueued: the file is written under a temporary name, fsynced and atomically renamed into place,
+  so the drain never sees a partial submission and an accepted submission survives a crash or restart;
+- at least once: spool files are deleted only after the transaction inserting them has committed, so a crash
+  between the commit and the deletion inserts that batch again on the next drain;
+- no ordering guarantee between submissions, and the date of a row is the date it was drained;
+- the spool directory must be local to the web workers and the drain process (the same host or a shared
+  volume); a file that cannot be read, or whose row the database rejects, is moved to the 'failed' subdirectory
+  and is not retried. A rejected row makes its batch fall back to one insert per row, so the other submissions
+  of the batch are still inserted.
+
+Functions:
+- enqueue_submission: writes a validated submission into the spool.
+- drain_submissions: inserts the spooled submissions into the database.
+"""
+
+
+import json
+import logging
+import os
+import uuid
+from itertools import islice
+from time import time_ns
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+from .forms import POST_FORMS
+
+
+logger = logging.getLogger(__name__)
+
+FAILED_DIR = 'failed'
+
+
+def _spool_dir():
+    path = settings.FORM_SPOOL_DIR
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def enqueue_submission(form_name, cleaned_data):
+    """
+    Writes a validated submission into the spool directory.
+
+    Args:
+    - form_name: key of main_page.forms.POST_FORMS.
+    - cleaned_data: the cleaned data of the valid form.
+    """
+    spool_dir = _spool_dir()
+    name = f'{time_ns()}-{uuid.uuid4().hex}.json'
+    tmp_path = os.path.join(spool_dir, f'.{name}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as spool_file:
+        json.dump({'form': form_name, 'data': cleaned_data}, spool_file)
+        spool_file.flush()
+        os.fsync(spool_file.fileno())
+    os.replace(tmp_path, os.path.join(spool_dir, name))
+
+
+def _read(path):
+    with open(path, encoding='utf-8') as spool_file:
+        submission = json.load(spool_file)
+    model = POST_FORMS[submission['form']]._meta.model
+    return model, model(**submission['data'])
+
+
+def _quarantine(spool_dir, path):
+    os.makedirs(os.path.join(spool_dir, FAILED_DIR), exist_ok=True)
+    os.replace(path, os.path.join(spool_dir, FAILED_DIR, os.path.basename(path)))
+
+
+def _insert(rows):
+    objects = {}
+    for model, obj, _ in rows:
+        objects.setdefault(model, []).append(obj)
+    with transaction.atomic():
+        for model, model_objects in objects.items():
+            model.objects.bulk_create(model_objects)
+
+
+def _insert_each(spool_dir, rows):
+    inserted = []
+    for row in rows:
+        try:
+            _insert([row])
+        except (DatabaseError, ValueError, TypeError):
+            logger.warning('Could not insert the spooled submission %s', row[2], exc_info=True)
+            _quarantine(spool_dir, row[2])
+        else:
+            inserted.append(row)
+    return inserted
+
+
+def drain_submissions(batch_size=None):
+    """
+    Inserts the spooled submissions with bulk_create, one transaction per batch, oldest first.
+
+    Args:
+    - batch_size: the number of spool files per batch, FORM_SPOOL_BATCH_SIZE by default.
+
+    Returns:
+    - dictionary mapping the model name to the number of inserted rows.
+    """
+    batch_size = batch_size or settings.FORM_SPOOL_BATCH_SIZE
+    spool_dir = _spool_dir()
+    names = iter(sorted(name for name in os.listdir(spool_dir) if name.endswith('.json')))
+    inserted = {}
+
+    while batch := list(islice(names, batch_size)):
+        rows = []
+        for path in (os.path.join(spool_dir, name) for name in batch):
+            try:
+                model, obj = _read(path)
+            except (OSError, ValueError, KeyError, TypeError):
+                _quarantine(spool_dir, path)
+                continue
+            rows.append((model, obj, path))
+
+        try:
+            _insert(rows)
+        except (DatabaseError, ValueError, TypeError):
+            # one bad row rolls back the whole batch: insert the rows one by one and set the failing ones aside
+            rows = _insert_each(spool_dir, rows)
+        for model, obj, path in rows:
+            inserted[model.__name__] = inserted.get(model.__name__, 0) + 1
+            os.remove(path)
+
+    return inserted
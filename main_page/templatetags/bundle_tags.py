@@ -0,0 +1,36 @@
+"""
+Module containing the template tags of the static asset bundles.
+
+Functions:
+- bundle: links a bundle of main_page.bundles, or its individual files in debug mode.
+"""
+
+
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from ..bundles import BUNDLES, get_bundle_manifest
+
+
+register = template.Library()
+
+TAGS = {
+    '.css': '<link href="{}" rel="stylesheet">',
+    '.js': '<script src="{}"></script>',
+}
+
+
+@register.simple_tag
+def bundle(name):
+    """
+    Links the built bundle when ASSET_BUNDLES is on and the bundles were built (manage.py build_bundles),
+    otherwise every file of the bundle separately, e.g. {% bundle 'main.css' %}.
+    :param name: name of the bundle, a key of BUNDLES
+    :return: the safe HTML of the <link> or <script> tags
+    """
+    hashed = get_bundle_manifest().get(name) if settings.ASSET_BUNDLES else None
+    paths = [hashed] if hashed else BUNDLES[name]
+    tag = TAGS['.css' if name.endswith('.css') else '.js']
+    return format_html_join('\n    ', tag, ((static(path),) for path in paths))
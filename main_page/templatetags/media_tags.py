@@ -0,0 +1,67 @@
+"""
+Module containing the template tags of the uploaded media.
+
+Functions:
+- responsive_image: renders an uploaded image with the srcset, sizes, width and height of its variants.
+"""
+
+
+from django import template
+from django.forms.utils import flatatt
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+from ..image_variants import get_variants
+
+
+register = template.Library()
+
+ONERROR = "this.onerror=null;this.removeAttribute('srcset');this.parentNode.querySelectorAll('source')" \
+          ".forEach(function(s){s.remove()});this.src='%s';"
+
+
+def _srcset(variants, name):
+    return ', '.join(f'{url} {width}w' for width, height, format, url in variants if format == name)
+
+
+@register.simple_tag
+def responsive_image(image, sizes='100vw', fallback='', **attrs):
+    """
+    Renders an uploaded image as a <picture> with a WebP source and a JPEG <img>, both with srcset/sizes, and the
+    width/height of the largest variant so the browser reserves the space before loading it. The style starts with
+    'height: auto' so that an image sized by CSS width only (e.g. the owl.carousel slides) keeps the aspect ratio of
+    the attributes instead of their height; a height set by the style or a CSS class still applies. An image without
+    variants is rendered as a plain <img>.
+
+    Args:
+    - image: FieldFile (or snapshot ImageRef) of the uploaded image.
+    - sizes: the sizes attribute, the rendered width of the image in the layout.
+    - fallback: static path of the image shown when the upload is missing.
+    - attrs: additional attributes of the <img>, e.g. class, alt and style.
+
+    Returns:
+    - the safe HTML of the image.
+    """
+    name = getattr(image, 'name', None) or ''
+    variants = get_variants().get(name) if name else None
+    if fallback:
+        attrs['onerror'] = ONERROR % static(fallback)
+
+    if not variants:
+        attrs['src'] = image.url if name else static(fallback)
+        return format_html('<img{}>', flatatt(attrs))
+
+    width, height, _, _ = variants[-1]
+    jpeg = [url for _, _, format, url in variants if format == 'jpeg']
+    attrs.update({
+        'src': jpeg[-1] if jpeg else image.url,
+        'srcset': _srcset(variants, 'jpeg'),
+        'sizes': sizes,
+        'width': width,
+        'height': height,
+        'style': f'height: auto; {attrs.get("style", "")}'.strip(),
+    })
+    return format_html(
+        '<picture style="display: contents"><source type="image/webp" srcset="{}" sizes="{}"><img{}></picture>',
+        _srcset(variants, 'webp'), sizes, flatatt(attrs),
+    )
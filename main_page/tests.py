@@ -1,3 +1,660 @@
-from django.test import TestCase
+import json
+import os
+import re
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser, Group
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.template.base import Template
+from django.template.loader import render_to_string
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from .bundles import _rewrite_urls, minify_css
+from .content_cache import VERSION_KEY, bump_content_version, get_content_version
+from .context_data import PAGE_BLOCKS, aget_page_context, get_common_context, get_page_context
+from account.roles import MANAGER_GROUP
+from .image_variants import get_variants, render_variants
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, clear_metrics, collect_metrics
+from .models import Appointment, Classes, Contacts, ImageVariant, SiteSnapshot, Subscription
+from .profiling import get_profiles, make_profile_token
+from .query_budget import QUERY_BUDGETS, check_budget
+from .sampling import sample_visible
+from .slow_queries import clear_captures, get_captures
+from .snapshot import ImageRef, load_site_settings
+from .storage import ContentAddressedStorage
+from .submission_queue import drain_submissions, enqueue_submission
+from .templatetags.media_tags import responsive_image
+from .throttle import _take_token
+from .work_list import WORK_LISTS, get_pending_counts, get_pending_page, mark_processed
+
+
+FIXTURE = str(settings.BASE_DIR / 'data.json')
+
+
+class SiteTestCase(TestCase):
+    """
+    TestCase with the content of data.json and an empty cache, so that no cached page or context of another test
+    is served.
+    """
+    fixtures = [FIXTURE]
+
+    def setUp(self):
+        cache.clear()
+
+    def override_directory(self, setting, **extra):
+        """
+        Points a directory setting at a temporary directory for the duration of the test.
+        :return: str, the path of the directory
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(**{setting: directory.name}, **extra)
+        override.enable()
+        self.addCleanup(override.disable)
+        return directory.name
+
+
+class TemplateIncludeQueriesTest(SiteTestCase):
+    """
+    The template includes must render from the prepared context without touching the database,
+    otherwise every row they loop over costs an extra query (N+1).
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.context = get_common_context()
+        # the image variants are loaded once per content version, not per rendered image
+        get_variants()
+
+    def test_classes_block_renders_without_queries(self):
+        self.assertTrue(self.context['classes'])
+        with self.assertNumQueries(0):
+            render_to_string('classes_block.html', self.context)
+
+    def test_classes_page_renders_without_queries(self):
+        with self.assertNumQueries(0):
+            render_to_string('classes.html', self.context)
+
+    def test_team_renders_without_queries(self):
+        with self.assertNumQueries(0):
+            render_to_string('team.html', self.context)
+
+    def test_testimonial_renders_without_queries(self):
+        with self.assertNumQueries(0):
+            render_to_string('testimonial.html', self.context)
+
+
+class PageContextTest(SiteTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.request = RequestFactory().get('/login/')
+        self.request.user = AnonymousUser()
+
+    def test_only_declared_blocks_are_added(self):
+        context = get_page_context(self.request, 'login.html')
+        self.assertIn('contacts', context)
+        self.assertNotIn('classes', context)
+        self.assertNotIn('slider', context)
+
+    def test_blocks_are_loaded_when_touched(self):
+        # the content version is read from the database once per CONTENT_VERSION_MAX_AGE
+        get_content_version()
+        with self.assertNumQueries(0):
+            context = get_page_context(self.request, 'login.html')
+        with self.assertNumQueries(1):
+            self.assertEqual(context['contacts'].id, 1)
+
+    def test_saved_singleton_rebuilds_the_snapshot(self):
+        contacts = Contacts.objects.get(id=1)
+        contacts.address = 'New address 1'
+        contacts.save()
+        context = get_page_context(self.request, 'login.html')
+        # the snapshot row, loaded by the new content version
+        with self.assertNumQueries(1):
+            self.assertEqual(context['contacts'].address, 'New address 1')
+        self.assertContains(self.client.get(reverse('contacts')), 'New address 1')
+
+        contacts.delete()
+        self.assertIsNone(SiteSnapshot.objects.get().payload['contacts'])
+        self.assertNotContains(self.client.get(reverse('contacts')), 'New address 1')
+
+    def test_snapshot_is_immutable(self):
+        contacts = get_page_context(self.request, 'login.html')['contacts']
+        with self.assertRaises(AttributeError):
+            contacts.address = 'Changed in a template'
+        with self.assertRaises(AttributeError):
+            load_site_settings().contacts = None
+
+    async def test_async_context_has_the_same_blocks(self):
+        context = await aget_page_context(self.request, 'index.html')
+        self.assertEqual(set(context), set(PAGE_BLOCKS['index.html']))
+        self.assertEqual(context['contacts'].id, 1)
+        self.assertTrue(context['classes'])
+
+
+class SamplingTest(SiteTestCase):
+    """
+    The samples are drawn from the cached pool of the visible ids and never contain a row hidden since.
+    """
+
+    def test_hidden_row_is_not_sampled(self):
+        visible = Classes.objects.filter(is_visible=True)
+        self.assertEqual(len(sample_visible(visible, 100)), visible.count())
+        hidden = visible.first()
+        # hidden by another worker, whose new content version this worker has not read yet
+        Classes.objects.filter(pk=hidden.pk).update(is_visible=False)
+        sample = sample_visible(Classes.objects.all(), 100)
+        self.assertEqual(len(sample), visible.count())
+        self.assertNotIn(hidden.pk, [item.pk for item in sample])
+
+
+class ImageVariantTest(TestCase):
+    """
+    Uploaded images are resized to the configured widths without upscaling and rendered with srcset/sizes.
+    """
+
+    def test_variants_are_not_upscaled(self):
+        buffer = BytesIO()
+        Image.new('RGB', (400, 200)).save(buffer, 'JPEG')
+        rendered = render_variants(buffer.getvalue(), (90, 360, 720), 80)
+        self.assertEqual([(width, height, name) for width, height, name, _ in rendered], [
+            (90, 45, 'webp'), (90, 45, 'jpeg'), (360, 180, 'webp'), (360, 180, 'jpeg'),
+        ])
+
+    def test_dimensions_keep_the_aspect_ratio(self):
+        cache.clear()
+        ImageVariant.objects.bulk_create(
+            ImageVariant(source='slider/a.jpg', width=width, height=width // 2, format=format,
+                         image=f'variants/a-{width}.{format}')
+            for width in (360, 1280) for format in ('webp', 'jpeg')
+        )
+        bump_content_version()
+        html = responsive_image(ImageRef('slider/a.jpg'))
+        for attribute in ('width="1280"', 'height="640"', 'style="height: auto;"'):
+            self.assertIn(attribute, html)
+        html = responsive_image(ImageRef('slider/a.jpg'), style='width: 45px; height: 45px;')
+        self.assertIn('style="height: auto; width: 45px; height: 45px;"', html)
+
+    def test_image_without_variants_renders_plain_img(self):
+        html = responsive_image(None, fallback='img/user.jpg', alt='User')
+        self.assertTrue(html.startswith('<img'))
+        self.assertIn('src="/static/img/user.jpg"', html)
+
+
+class MediaStorageTest(TestCase):
+    """
+    Uploads are named by their content, so identical uploads share a file and media is served as immutable.
+    """
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        self.storage = ContentAddressedStorage(location=self.media_root.name)
+
+    def test_identical_uploads_are_deduplicated(self):
+        first = self.storage.save('team/a.JPG', ContentFile(b'photo'))
+        second = self.storage.save('team/b.jpg', ContentFile(b'photo'))
+        other = self.storage.save('team/c.jpg', ContentFile(b'other photo'))
+        self.assertEqual(first, second)
+        self.assertRegex(first, r'^team/[0-9a-f]{32}\.jpg$')
+        self.assertNotEqual(first, other)
+
+    def test_media_is_served_immutable_with_etag(self):
+        name = self.storage.save('team/a.jpg', ContentFile(b'photo'))
+        with override_settings(MEDIA_ROOT=self.media_root.name):
+            response = self.client.get(f'/media/{name}')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('immutable', response['Cache-Control'])
+            revalidated = self.client.get(f'/media/{name}', HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(revalidated.status_code, 304)
+            self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+
+
+class BundleTest(TestCase):
+    """
+    Stylesheets moved into a bundle keep pointing at the same files.
+    """
+
+    def test_css_urls_are_relative_to_the_bundle(self):
+        css = _rewrite_urls('a { background: url(../img/x.png) } b { background: url("data:image/png;base64,x") }',
+                            'css/style.css')
+        self.assertEqual(minify_css(css), 'a{background:url("../img/x.png")}b{background:url("data:image/png;base64,x")}')
+
+
+class QueryBudgetTest(SiteTestCase):
+    """
+    Every view stays within its budget in main_page.query_budget, for an anonymous visitor and for a manager.
+    """
+    # view name: (method, URL kwargs, POST data, visitors)
+    REQUESTS = {
+        'main_page:index': ('get', {}, None, ('anonymous', 'manager')),
+        'about': ('get', {}, None, ('anonymous', 'manager')),
+        'contacts': ('get', {}, None, ('anonymous', 'manager')),
+        'classes': ('get', {}, None, ('anonymous', 'manager')),
+        'join_us': ('get', {}, None, ('anonymous', 'manager')),
+        'schedule': ('get', {}, None, ('anonymous', 'manager')),
+        'login_view': ('get', {}, None, ('anonymous', 'manager')),
+        'registration_view': ('get', {}, None, ('anonymous', 'manager')),
+        'logout_view': ('get', {}, None, ('manager',)),
+        'main_page:manager_list': ('get', {}, None, ('manager',)),
+        'main_page:process_requests': ('post', {'kind': 'appointment'}, {'ids': ['1', '2']}, ('manager',)),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = get_user_model().objects.create_user('budget-manager')
+        cls.manager.groups.add(Group.objects.get(name=MANAGER_GROUP))
+
+    def test_every_view_has_a_budget(self):
+        self.assertEqual(set(self.REQUESTS), set(QUERY_BUDGETS))
+
+    def test_views_stay_within_budget(self):
+        for view_name, (method, kwargs, data, visitors) in self.REQUESTS.items():
+            for visitor in visitors:
+                with self.subTest(view=view_name, visitor=visitor):
+                    cache.clear()
+                    if visitor == 'manager':
+                        self.client.force_login(self.manager)
+                    else:
+                        self.client.logout()
+                    with CaptureQueriesContext(connection) as queries:
+                        response = getattr(self.client, method)(reverse(view_name, kwargs=kwargs), data)
+                    self.assertLess(response.status_code, 400)
+                    self.assertEqual(check_budget(view_name, [query['sql'] for query in queries]), [])
+
+    def test_n_plus_one_in_an_include_exceeds_the_budget(self):
+        context = get_common_context()
+        get_variants()
+        # without the select_related of RELATIONS every class loads its teacher separately
+        context['classes'] = list(Classes.objects.all())
+        with CaptureQueriesContext(connection) as queries:
+            render_to_string('classes_block.html', context)
+        self.assertTrue(check_budget('classes', [query['sql'] for query in queries]))
+
+
+class ServerTimingTest(SiteTestCase):
+    """
+    A sampled request logs its database, template and view times, which staff users also get in the header.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.render = Template._render
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1.0)
+    def test_sampled_request_has_server_timing(self):
+        with self.assertLogs('main_page.server_timing'):
+            self.assertNotIn('Server-Timing', self.client.get(reverse('classes')))
+        self.assertIs(Template._render, self.render)
+
+        cache.clear()
+        self.client.force_login(get_user_model().objects.create_user('timer', is_staff=True))
+        with self.assertLogs('main_page.server_timing') as logs:
+            response = self.client.get(reverse('classes'))
+        metrics = [metric.split(';')[0] for metric in response['Server-Timing'].split(', ')]
+        self.assertEqual(metrics[0], 'db')
+        self.assertIn('tpl-classes.html', metrics)
+        self.assertEqual(metrics[-2:], ['view', 'total'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'classes')
+        self.assertGreater(record['db_queries'], 0)
+
+    def test_disabled_by_default(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('classes')))
+
+
+class ProfilingTest(SiteTestCase):
+    """
+    Staff users and signed tokens trigger a capture of the view; the directory keeps the newest captures.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.override_directory('PROFILE_DIR', PROFILE_MAX_FILES=2)
+
+    def test_triggers(self):
+        self.client.get(reverse('classes'), {'profile': ''})
+        self.assertEqual(get_profiles(), {})
+
+        self.client.force_login(get_user_model().objects.create_user('profiler', is_staff=True))
+        self.client.get(reverse('classes'), {'profile': ''})
+        self.client.logout()
+        self.client.get(reverse('about'), HTTP_X_PROFILE_TOKEN=make_profile_token())
+        self.client.get(reverse('about'), HTTP_X_PROFILE_TOKEN='profile:forged')
+        self.assertEqual({view: len(paths) for view, paths in get_profiles().items()}, {'classes': 1, 'about': 1})
+
+        output = StringIO()
+        call_command('profile_report', view=['about'], limit=5, stdout=output)
+        self.assertIn('about: 1 profiles', output.getvalue())
+
+    def test_rotation(self):
+        token = make_profile_token()
+        for _ in range(3):
+            self.client.get(reverse('about'), HTTP_X_PROFILE_TOKEN=token)
+        self.assertEqual(len(get_profiles()['about']), 2)
+
+
+@override_settings(METRICS_TOKEN='scraper-token')
+class MetricsTest(SiteTestCase):
+    """
+    The metrics of the requests, form submissions and logins are merged from the files of all processes.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.override_directory('METRICS_DIR')
+        clear_metrics()
+
+    def test_metrics(self):
+        self.client.get(reverse('classes'))
+        self.client.post(reverse('join_us'), {'form_name': 'subscription', 'email': 'parent@example.com'})
+        self.client.post(reverse('join_us'), {'form_name': 'subscription', 'email': 'not an email'})
+        self.client.post(reverse('login_view'), {'username': 'nobody', 'password': 'wrong-password'})
+        # another worker process, still running
+        Path(settings.METRICS_DIR, f'{os.getppid()}-1.json').write_text(json.dumps({
+            'counters': [['requests_total', [['method', 'GET'], ['status', 200], ['view', 'classes']], 2]],
+            'histograms': [],
+        }))
+
+        self.assertEqual(self.client.get(reverse('main_page:metrics')).status_code, 403)
+        response = self.client.get(reverse('main_page:metrics'), HTTP_AUTHORIZATION='Bearer scraper-token')
+        self.assertEqual(response['Content-Type'], METRICS_CONTENT_TYPE)
+        lines = response.content.decode().splitlines()
+        for line in (
+            'd_site_requests_total{method="GET",status="200",view="classes"} 3',
+            'd_site_form_submissions_total{model="Subscription",result="saved"} 1',
+            'd_site_form_submissions_total{model="Subscription",result="invalid"} 1',
+            'd_site_logins_total{result="failure"} 1',
+            'd_site_request_duration_seconds_count{view="classes"} 1',
+        ):
+            self.assertIn(line, lines)
+
+    def test_exited_processes_are_archived(self):
+        exited = subprocess.Popen(['true'])
+        exited.wait()
+        exited_file = Path(settings.METRICS_DIR, f'{exited.pid}-1.json')
+        exited_file.write_text(json.dumps({
+            'counters': [['logins_total', [['result', 'success']], 2]],
+            'histograms': [],
+        }))
+
+        for _ in range(2):
+            counters, _ = collect_metrics()
+            self.assertEqual(counters['logins_total', (('result', 'success'),)], 2)
+        self.assertFalse(exited_file.exists())
+        self.assertTrue(Path(settings.METRICS_DIR, 'exited.json').exists())
+
+    def test_concurrent_scrapes(self):
+        self.client.get(reverse('classes'))
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(lambda _: collect_metrics(), range(32)))
+        for counters, _ in results:
+            self.assertEqual(counters['requests_total', (('method', 'GET'), ('status', 200), ('view', 'classes'))], 1)
+
+
+@override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_BUFFER_SIZE=5)
+class SlowQueryTest(SiteTestCase):
+    """
+    With a zero threshold every query is captured with its view, stack and plan; staff users see the last captures.
+    """
+
+    def setUp(self):
+        super().setUp()
+        clear_captures()
+        self.logs = self.assertLogs('main_page.slow_queries', 'WARNING')
+        self.logs.__enter__()
+        self.addCleanup(self.logs.__exit__, None, None, None)
+
+    def test_captures(self):
+        self.client.get(reverse('classes'))
+        captures = get_captures()
+        self.assertEqual(len(captures), 5)
+        select = next(capture for capture in captures if capture['sql'].startswith('SELECT'))
+        self.assertEqual(select['view'], 'classes')
+        self.assertTrue(select['plan'])
+        self.assertIsNone(select['plan_error'])
+        self.assertTrue(any('main_page' in frame for frame in select['stack']))
+
+    def test_staff_view(self):
+        self.client.get(reverse('classes'))
+        self.assertEqual(self.client.get(reverse('main_page:slow_queries')).status_code, 302)
+
+        self.client.force_login(get_user_model().objects.create_user('dba', is_staff=True))
+        self.assertContains(self.client.get(reverse('main_page:slow_queries')), 'classes')
+        response = self.client.get(reverse('main_page:slow_queries'), {'format': 'jsonl'})
+        lines = response.content.decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[0])['view'], 'main_page:slow_queries')
+
+    @override_settings(SLOW_QUERY_BUFFER_SIZE=50)
+    def test_parameters_are_not_captured(self):
+        # a manager, whose session key is looked up in the session table
+        user = get_user_model().objects.create_user('dba', password='dba-password', is_staff=True)
+        user.groups.add(Group.objects.get_or_create(name=MANAGER_GROUP)[0])
+        self.client.post(reverse('login_view'), {'username': 'dba', 'password': 'dba-password'})
+        clear_captures()
+        response = self.client.get(reverse('main_page:slow_queries'), {'format': 'jsonl'})
+        self.assertNotIn(self.client.cookies[settings.MANAGER_SESSION_COOKIE_NAME].value, response.content.decode())
+        session_query = next(capture for capture in get_captures() if 'django_session' in capture['sql'])
+        self.assertNotIn('params', session_query)
+        self.assertEqual(session_query['plan'], [])
+
+
+class PageCacheTest(SiteTestCase):
+    """
+    Anonymous GET requests are served from the page cache with the CSRF token of the visitor; logged-in users and
+    POST requests reach the view, and a new content version invalidates the cached pages.
+    """
+
+    def get(self, client=None, **extra):
+        return (client or self.client).get(reverse('join_us'), **extra)
+
+    def test_cached_page_has_the_token_of_the_visitor(self):
+        self.assertEqual(self.get()['X-Page-Cache'], 'MISS')
+        tokens = set()
+        for _ in range(2):
+            client = Client(enforce_csrf_checks=True)
+            response = self.get(client)
+            self.assertEqual(response['X-Page-Cache'], 'HIT')
+            token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode())[1]
+            tokens.add(token)
+            response = client.post(reverse('join_us'), {
+                'csrfmiddlewaretoken': token, 'form_name': 'subscription', 'email': 'parent@example.com',
+            })
+            self.assertNotEqual(response.status_code, 403)
+        self.assertEqual(len(tokens), 2)
+
+    def test_authenticated_and_post_requests_bypass_the_cache(self):
+        self.get()
+        self.assertNotIn('X-Page-Cache', self.client.post(reverse('join_us'), {'form_name': 'subscription'}))
+        self.client.force_login(get_user_model().objects.create_user('page-cache-parent'))
+        self.assertNotIn('X-Page-Cache', self.get())
+
+    def test_content_version_is_shared_through_the_database(self):
+        version = get_content_version()
+        # the bump of another worker, whose cache this worker does not see
+        SiteSnapshot.objects.update(updated=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(get_content_version(), version)
+        cache.delete(VERSION_KEY)  # CONTENT_VERSION_MAX_AGE elapsed
+        self.assertGreater(get_content_version(), version)
+
+    def test_content_changes_invalidate_the_cache(self):
+        url = reverse('classes')
+        self.client.get(url)
+        classes = Classes.objects.filter(is_visible=True).first()
+        classes.title = 'Renamed class'
+        classes.image = ''
+        classes.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'Renamed class')
+
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+        classes.delete()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertNotContains(response, 'Renamed class')
+
+    def test_content_version_invalidates_the_cache(self):
+        self.get()
+        self.assertEqual(self.get()['X-Page-Cache'], 'HIT')
+        bump_content_version()
+        self.assertEqual(self.get()['X-Page-Cache'], 'MISS')
+
+
+@override_settings(FORM_WRITE_BEHIND=False)
+class PostFormTest(SiteTestCase):
+    """
+    The form named by form_name is saved and redirected to the same page, answered with 204 or the errors as JSON
+    for AJAX, and an unknown form name is rejected.
+    """
+
+    def post(self, data, **extra):
+        return self.client.post(reverse('join_us'), {'form_name': 'subscription', **data}, **extra)
+
+    def test_saved_form_redirects(self):
+        response = self.post({'email': 'parent@example.com'})
+        self.assertEqual(response.status_code, 303)
+        self.assertEqual(response['Location'], reverse('join_us'))
+        self.assertTrue(Subscription.objects.filter(email='parent@example.com').exists())
+
+    def test_invalid_form_renders_the_errors(self):
+        response = self.post({'email': 'not an email'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['subscription'].errors)
+
+    def test_ajax(self):
+        response = self.post({'email': 'parent@example.com'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 204)
+        response = self.post({'email': 'not an email'}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.json()['errors'])
+
+    def test_unknown_form(self):
+        count = Subscription.objects.count()
+        self.assertEqual(self.post({'form_name': 'unknown', 'email': 'parent@example.com'}).status_code, 400)
+        self.assertEqual(Subscription.objects.count(), count)
+
+
+class WorkListTest(SiteTestCase):
+    """
+    The unprocessed requests are paged by a (date, id) cursor, counted in one query and marked processed in bulk
+    by managers only.
+    """
+
+    def setUp(self):
+        super().setUp()
+        Subscription.objects.bulk_create(Subscription(email=f'parent{i}@example.com') for i in range(5))
+        self.pending = list(Subscription.objects.filter(is_processed=False).order_by('-date', '-pk'))
+
+    def login_manager(self):
+        manager = get_user_model().objects.create_user('work-list-manager')
+        manager.groups.add(Group.objects.get_or_create(name=MANAGER_GROUP)[0])
+        self.client.force_login(manager)
+
+    def test_pages_across_equal_dates(self):
+        pages = []
+        cursor = None
+        while True:
+            items, cursor = get_pending_page('subscription', cursor, size=2)
+            pages.append(items)
+            if cursor is None:
+                break
+        self.assertEqual([item for page in pages for item in page], self.pending)
+        self.assertTrue(all(len(page) == 2 for page in pages[:-1]))
+        self.assertEqual(get_pending_page('subscription', 'not-a-cursor', size=2)[0], self.pending[:2])
+
+    def test_counts_and_mark_processed(self):
+        with self.assertNumQueries(1):
+            counts = get_pending_counts()
+        self.assertEqual(counts, {
+            kind: model.objects.filter(is_processed=False).count() for kind, model in WORK_LISTS.items()
+        })
+
+        ids = [item.pk for item in self.pending[:3]]
+        self.assertEqual(mark_processed('subscription', ids), 3)
+        self.assertEqual(mark_processed('subscription', ids), 0)
+        self.assertEqual(get_pending_counts()['subscription'], counts['subscription'] - 3)
+
+    def test_process_requests_view(self):
+        url = reverse('main_page:process_requests', args=['subscription'])
+        ids = {'ids': [item.pk for item in self.pending[:2]]}
+        self.assertEqual(self.client.post(url, ids).status_code, 302)
+        self.assertEqual(Subscription.objects.filter(is_processed=False).count(), len(self.pending))
+
+        self.login_manager()
+        self.assertEqual(self.client.post(url.replace('subscription', 'unknown'), ids).status_code, 404)
+        self.assertEqual(self.client.post(url, {'ids': ['x']}).status_code, 400)
+        response = self.client.post(url, ids, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.json(), {'kind': 'subscription', 'updated': 2})
+
+
+class SubmissionQueueTest(TestCase):
+    """
+    A spooled submission the database rejects is set aside without blocking the rest of its batch.
+    """
+
+    def test_rejected_row_is_moved_to_failed(self):
+        with tempfile.TemporaryDirectory() as spool_dir, override_settings(FORM_SPOOL_DIR=spool_dir):
+            appointment = {'name': 'Parent', 'email': 'parent@example.com', 'child_name': 'Child',
+                           'message': 'We would like to visit.'}
+            enqueue_submission('make_appointment', {**appointment, 'child_age': 'ab'})
+            enqueue_submission('make_appointment', {**appointment, 'child_age': '4'})
+
+            with self.assertLogs('main_page.submission_queue', 'WARNING'):
+                self.assertEqual(drain_submissions(), {'Appointment': 1})
+            self.assertEqual(Appointment.objects.get().child_age, 4)
+            self.assertEqual([name for name in os.listdir(spool_dir) if name.endswith('.json')], [])
+            self.assertEqual(len(os.listdir(os.path.join(spool_dir, 'failed'))), 1)
+
+
+@override_settings(THROTTLE_ENABLED=True, THROTTLE_RATES={'login': (2, 60), 'form': (2, 60)})
+class ThrottleTest(TestCase):
+    """
+    A client over the rate of a view gets 429 with Retry-After; the counts are atomic across concurrent requests.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rate_limit(self):
+        statuses = [self.client.post(reverse('join_us'), REMOTE_ADDR='10.0.0.1').status_code for _ in range(3)]
+        self.assertNotIn(429, statuses[:2])
+        self.assertEqual(statuses[2], 429)
+        response = self.client.post(reverse('join_us'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(1 <= int(response['Retry-After']) <= 120)
+        self.assertNotEqual(self.client.post(reverse('join_us'), REMOTE_ADDR='10.0.0.2').status_code, 429)
+        self.assertNotEqual(self.client.get(reverse('join_us'), REMOTE_ADDR='10.0.0.1').status_code, 429)
+
+    @override_settings(THROTTLE_PROXY_COUNT=1)
+    def test_client_behind_the_proxy(self):
+        def post(forwarded_for):
+            return self.client.post(reverse('join_us'), REMOTE_ADDR='10.0.0.254',
+                                    HTTP_X_FORWARDED_FOR=forwarded_for).status_code
+
+        # the entry added by the router counts, not the one the client sent
+        self.assertNotEqual(post('1.1.1.1, 203.0.113.1'), 429)
+        self.assertNotEqual(post('2.2.2.2, 203.0.113.1'), 429)
+        self.assertEqual(post('203.0.113.1'), 429)
+        self.assertNotEqual(post('203.0.113.2'), 429)
+
+    def test_concurrent_requests(self):
+        with ThreadPoolExecutor(8) as executor:
+            waits = list(executor.map(lambda _: _take_token(cache, 'throttle:test', 5, 60), range(40)))
+        self.assertEqual(waits.count(0), 5)
@@ -0,0 +1,129 @@
+"""
+Module containing the rate limiting of POST requests.
+
+Every POST to a view listed in THROTTLED_VIEWS is counted for its (client IP, view) pair. The allowed number of
+requests per period comes from THROTTLE_RATES for the view's scope: 'login' for the views that hash passwords, 'form'
+for the public forms. The requests of the last period are estimated with a sliding window: the count of the current
+window plus the count of the previous one weighted by its share of the last period. A request over the rate is not
+counted and answers 429 with a Retry-After header from process_view, i.e. before CSRF checks, form validation,
+password hashing or database writes.
+
+The counts are kept in the THROTTLE_CACHE_ALIAS cache and updated with cache.add and cache.incr, which are atomic in
+the shared cache backends, so that concurrent workers never lose a count. With the default per-process local memory
+cache every worker counts on its own and a client gets up to the rate times the number of workers. When the cache
+fails, a local memory cache of the process is used instead. The client IP is REMOTE_ADDR, or the entry of
+X-Forwarded-For appended by the last of THROTTLE_PROXY_COUNT trusted proxies (1, the default, behind the Heroku
+router, where REMOTE_ADDR is the router for every request).
+
+Classes:
+- ThrottleMiddleware: the middleware applying the buckets.
+
+Functions:
+- get_throttle_stats: returns the allowed and throttled request counts of the current process per scope.
+"""
+
+
+import logging
+import math
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+
+
+logger = logging.getLogger(__name__)
+
+THROTTLED_VIEWS = {
+    'login_view': 'login',
+    'registration_view': 'login',
+    'main_page:index': 'form',
+    'about': 'form',
+    'contacts': 'form',
+    'classes': 'form',
+    'join_us': 'form',
+    'schedule': 'form',
+}
+
+_fallback_cache = LocMemCache('kider-throttle', {})
+_stats = Counter()
+
+
+def get_throttle_stats():
+    """
+    Returns the request counts of the current process.
+    :return: dict mapping (scope, 'allowed' or 'throttled') to the number of requests
+    """
+    return dict(_stats)
+
+
+def get_client_ip(request):
+    proxies = settings.THROTTLE_PROXY_COUNT
+    forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if proxies and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(',')]
+        return hops[-min(proxies, len(hops))]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _take_token(cache, key, capacity, period):
+    """
+    Counts a request when the requests of the last period, this one included, are within capacity.
+    :return: 0 when the request is allowed, otherwise the seconds until it would be
+    """
+    now = time.time()
+    window, elapsed = divmod(now, period)
+    current_key = f'{key}:{int(window)}'
+    cache.add(current_key, 0, timeout=2 * period)
+    try:
+        count = cache.incr(current_key)
+    except ValueError:
+        # the count was evicted between add and incr
+        cache.set(current_key, 1, timeout=2 * period)
+        count = 1
+    previous = cache.get(f'{key}:{int(window) - 1}', 0)
+    if previous * (1 - elapsed / period) + count <= capacity:
+        return 0
+
+    try:
+        cache.decr(current_key)
+    except ValueError:
+        pass
+    count -= 1
+    if count < capacity:
+        # allowed in this window, once the weight of the previous one is low enough
+        wait = period * (1 - (capacity - count - 1) / previous) - elapsed
+    else:
+        # allowed in the next window, whose previous window is this one
+        wait = period - elapsed + period * (1 - (capacity - 1) / count)
+    return max(1, math.ceil(wait))
+
+
+class ThrottleMiddleware(MiddlewareMixin):
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.THROTTLE_ENABLED or request.method != 'POST':
+            return None
+        view_name = request.resolver_match.view_name
+        scope = THROTTLED_VIEWS.get(view_name)
+        if scope is None:
+            return None
+
+        capacity, period = settings.THROTTLE_RATES[scope]
+        key = f'throttle:{view_name}:{get_client_ip(request)}'
+        try:
+            retry_after = _take_token(caches[settings.THROTTLE_CACHE_ALIAS], key, capacity, period)
+        except Exception:
+            logger.warning('Throttle cache unavailable, using the local memory cache', exc_info=True)
+            retry_after = _take_token(_fallback_cache, key, capacity, period)
+
+        if not retry_after:
+            _stats[scope, 'allowed'] += 1
+            return None
+        _stats[scope, 'throttled'] += 1
+        response = HttpResponse('Too many requests, please try again later.', status=429)
+        response['Retry-After'] = str(retry_after)
+        return response
@@ -1,12 +1,18 @@
-from django.urls import path
-from main_page.views import index, update_manager, manager_list
+from django.conf import settings
+from django.urls import path, register_converter
+from main_page import async_views, views
+from main_page.views import metrics, process_requests, manager_list, slow_queries
+from main_page.work_list import KindConverter
 
 app_name = 'main_page'
 
+register_converter(KindConverter, 'kind')
 
 
 urlpatterns = [
-    path('', index, name='index'),
-    path('manager/update_manager/<int:pk>', update_manager, name='update_manager'),
+    path('', (async_views if settings.ASYNC_VIEWS else views).index, name='index'),
+    path('manager/<kind:kind>/process', process_requests, name='process_requests'),
     path('manager/manager_list/', manager_list, name='manager_list'),
+    path('manager/slow_queries/', slow_queries, name='slow_queries'),
+    path('metrics/', metrics, name='metrics'),
     ]
\ No newline at end of file
@@ -6,107 +6,290 @@ This module defines several views and helper functions for the website. The view
 - `classes(request)`: renders the 'classes' page of the website.
 - `join_us(request)`: renders the 'join us' page of the website.
 - `schedule(request)`: renders the 'schedule' page of the website.
-- `update_manager(request, pk)`: a view that updates the processed status of subscription,
-contact us and appointment requests.
+- `process_requests(request, kind)`: a view that marks the posted `ids` of one kind of request
+(`contact_us`, `subscription` or `appointment`) as processed in one UPDATE and returns the updated count.
 - `manager_list(request)`: a view that renders the list of unprocessed subscription,
-contact us and appointment requests for the website manager.
+contact us and appointment requests for the website manager, one keyset-paginated page per list
+(see `main_page.work_list`).
+- `metrics(request)`: the request, database, form and login metrics of all workers in the Prometheus text format,
+for staff users and for the scrapers sending the METRICS_TOKEN bearer token (see `main_page.metrics`).
+- `slow_queries(request)`: shows the slow queries captured by the process with their plans to staff users, or
+exports them as JSON lines (see `main_page.slow_queries`).
+- `serve_media(request, path)`: serves an uploaded file with immutable cache headers and an ETag, or hands it to
+the web server with X-Accel-Redirect when MEDIA_ACCEL_REDIRECT is set.
 
 The following helper functions are also defined:
-- `is_manager(user)`: a helper function that returns `True` if the user belongs to the 'manager' group.
-- `handle_post_request(request)`: a helper function that processes form data received from POST requests
-and saves the data if it is valid.
+- `handle_post_request(request, context)`: a helper function that validates and saves only the form named by the
+hidden `form_name` field of a POST request (see `main_page.forms.POST_FORMS`) and answers with a 303 redirect to the same page
+(post/redirect/get), or with 204/400 JSON responses for AJAX submissions. With FORM_WRITE_BEHIND enabled the
+submission is spooled instead of saved, see `main_page.submission_queue`.
+
+The manager views are restricted with `account.roles.manager_required`, which resolves the role once per
+request and session.
+
+The public pages (`index`, `about`, `contacts`, `classes` and `join_us`) are served from the page cache
+for anonymous GET requests, see `main_page.page_cache`.
 """
 
-from django.shortcuts import render, redirect
-from .context_data import get_common_context, get_page_context
-from .forms import MakeAppointmentForm, SubscriptionForm, ContactUsForm
-from .models import Subscription, ContactUs, Appointment
-from django.contrib.auth.decorators import login_required, user_passes_test
+import json
+import mimetypes
+import os
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied, SuspiciousFileOperation
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse
+from django.shortcuts import render
+from django.urls import reverse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_GET, require_POST
+from django.views.static import serve
+from .context_data import get_page_context
+from .forms import POST_FORMS
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, collect_metrics, increment, render_metrics
+from .page_cache import cache_public_page
+from .slow_queries import get_captures
+from .storage import is_hashed_name
+from .submission_queue import enqueue_submission
+from .work_list import get_pending_counts, get_pending_page, mark_processed
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
+from account.roles import manager_required
+
+MEDIA_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+MANAGER_LIST_CONTEXT = {
+    'contact_us': 'contact_us_viev_manager',
+    'subscription': 'subscription_viev_manager',
+    'appointment': 'make_appointment_viev_manager',
+}
+
+
+class HttpResponseSeeOther(HttpResponseRedirect):
+    status_code = 303
 
-def is_manager(user):
-    return user.groups.filter(name='manager').exists()
 
-def handle_post_request(request):
+def is_ajax(request):
+    return (request.headers.get('x-requested-with') == 'XMLHttpRequest'
+            or 'application/json' in request.headers.get('accept', ''))
 
-    make_appointment = MakeAppointmentForm(request.POST)
-    contact_us = ContactUsForm(request.POST)
-    subscription = SubscriptionForm(request.POST)
 
-    if make_appointment.is_valid():
-        make_appointment.save()
-        return redirect('/')
-    if contact_us.is_valid():
-        contact_us.save()
-        return redirect('/')
-    if subscription.is_valid():
-        subscription.save()
-        return redirect('/')
+def handle_post_request(request, context):
+    """
+    Validates and saves the form named by the hidden 'form_name' field; the other forms are not touched.
 
+    Args:
+    - request: HttpRequest object of the POST request.
+    - context: the page context; an invalid form replaces the unbound one under its name to show the errors.
+
+    Returns:
+    - HttpResponseSeeOther to the same page, or an empty 204 response for AJAX requests, if the form was saved;
+    - JsonResponse with the form errors and status 400 for invalid AJAX submissions;
+    - HttpResponseBadRequest for an unknown form name;
+    - None for invalid regular submissions, the view then renders the page.
+    """
+    form_name = request.POST.get('form_name')
+    form_class = POST_FORMS.get(form_name)
+    if form_class is None:
+        return HttpResponseBadRequest('Unknown form')
+
+    form = form_class(request.POST)
+    model_name = form_class._meta.model.__name__
+    if form.is_valid():
+        if settings.FORM_WRITE_BEHIND:
+            enqueue_submission(form_name, form.cleaned_data)
+            increment('form_submissions_total', model=model_name, result='spooled')
+        else:
+            form.save()
+            increment('form_submissions_total', model=model_name, result='saved')
+        if is_ajax(request):
+            return HttpResponse(status=204)
+        return HttpResponseSeeOther(request.path)
+
+    increment('form_submissions_total', model=model_name, result='invalid')
+    if is_ajax(request):
+        return JsonResponse({'errors': form.errors}, status=400)
+    context[form_name] = form
+    return None
+
+@cache_public_page
 def index(request):
+    data = get_page_context(request, 'index.html')
     if request.method == 'POST':
-        handle_post_request(request)
+        response = handle_post_request(request, data)
+        if response:
+            return response
 
-    data = get_page_context(request)
     return render(request, 'index.html', context=data)
 
+@cache_public_page
 def about(request):
+    data = get_page_context(request, 'about.html')
     if request.method == 'POST':
-        handle_post_request(request)
+        response = handle_post_request(request, data)
+        if response:
+            return response
 
-    data = get_page_context(request)
     return render(request, 'about.html', context=data)
 
+@cache_public_page
 def contacts(request):
+    data = get_page_context(request, 'contact.html')
     if request.method == 'POST':
-        handle_post_request(request)
+        response = handle_post_request(request, data)
+        if response:
+            return response
 
-    data = get_page_context(request)
     return render(request, 'contact.html', context=data)
 
+@cache_public_page
 def classes(request):
+    data = get_page_context(request, 'classes.html')
     if request.method == 'POST':
-        handle_post_request(request)
+        response = handle_post_request(request, data)
+        if response:
+            return response
 
-    data = get_page_context(request)
     return render(request, 'classes.html', context=data)
 
+@cache_public_page
 def join_us(request):
+    data = get_page_context(request, 'join_us.html')
     if request.method == 'POST':
-        handle_post_request(request)
+        response = handle_post_request(request, data)
+        if response:
+            return response
 
-    data = get_page_context(request)
     return render(request, 'join_us.html', context=data)
 
 
 def schedule(request):
+    data = get_page_context(request, 'schedule.html')
     if request.method == 'POST':
-        handle_post_request(request)
+        response = handle_post_request(request, data)
+        if response:
+            return response
 
-    data = get_page_context(request)
     return render(request, 'schedule.html', context=data)
 
 
 
 @login_required(login_url='/login/')
-@user_passes_test(is_manager)
-def update_manager(request, pk):
-    Subscription.objects.filter(pk=pk).update(is_processed=True)
-    ContactUs.objects.filter(pk=pk).update(is_processed=True)
-    Appointment.objects.filter(pk=pk).update(is_processed=True)
-    return redirect('main_page:manager_list')
+@manager_required
+@require_POST
+def process_requests(request, kind):
+    try:
+        ids = [int(pk) for pk in request.POST.getlist('ids')]
+    except ValueError:
+        return HttpResponseBadRequest('Invalid ids')
+
+    updated = mark_processed(kind, ids)
+    if is_ajax(request):
+        return JsonResponse({'kind': kind, 'updated': updated})
+    return HttpResponseSeeOther(reverse('main_page:manager_list'))
 
 
 @login_required(login_url='/login/')
-@user_passes_test(is_manager)
+@manager_required
 def manager_list(request):
-    subscription_viev_manager = Subscription.objects.filter(is_processed=False)
-    contact_us_viev_manager = ContactUs.objects.filter(is_processed=False)
-    make_appointment_viev_manager = Appointment.objects.filter(is_processed=False)
-    data = {
-        'subscription_viev_manager': subscription_viev_manager,
-        'make_appointment_viev_manager': make_appointment_viev_manager,
-        'contact_us_viev_manager': contact_us_viev_manager,
-    }
-    context_data = get_common_context()
-    data.update(context_data)
-    return render(request, 'manager.html', context=data)
\ No newline at end of file
+    data = get_page_context(request, 'manager.html')
+    data['pending_counts'] = get_pending_counts()
+
+    for kind, context_name in MANAGER_LIST_CONTEXT.items():
+        items, next_cursor = get_pending_page(
+            kind, request.GET.get(f'{kind}_after'), settings.MANAGER_PAGE_SIZE)
+        data[context_name] = items
+        if next_cursor:
+            params = request.GET.copy()
+            params[f'{kind}_after'] = next_cursor
+            data[f'{kind}_next'] = f'?{params.urlencode()}'
+    return render(request, 'manager.html', context=data)
+
+
+@require_GET
+@never_cache
+def metrics(request):
+    """
+    Returns the metrics merged from all worker processes, see main_page.metrics.
+
+    Args:
+    - request: HttpRequest object of a staff user, or with the 'Authorization: Bearer <METRICS_TOKEN>' header.
+
+    Returns:
+    - the metrics in the Prometheus text format, or 403 for the other requests.
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    if not (request.user.is_staff or token and constant_time_compare(authorization, f'Bearer {token}')):
+        raise PermissionDenied
+    return HttpResponse(render_metrics(*collect_metrics()), content_type=METRICS_CONTENT_TYPE)
+
+
+@require_GET
+@staff_member_required
+def slow_queries(request):
+    """
+    Shows the slow queries captured by the process serving the request, newest first.
+
+    Args:
+    - request: HttpRequest object of a staff user; with ?format=jsonl the captures are downloaded as JSON lines.
+
+    Returns:
+    - the captures page, or the slow-queries.jsonl attachment.
+    """
+    captures = get_captures()
+    if request.GET.get('format') == 'jsonl':
+        response = HttpResponse(
+            ''.join(json.dumps(capture) + '\n' for capture in captures), content_type='application/x-ndjson',
+        )
+        response['Content-Disposition'] = 'attachment; filename="slow-queries.jsonl"'
+        return response
+    return render(request, 'slow_queries.html', {
+        'captures': captures,
+        'threshold': settings.SLOW_QUERY_THRESHOLD_MS,
+        'buffer_size': settings.SLOW_QUERY_BUFFER_SIZE,
+    })
+
+
+@require_GET
+def serve_media(request, path):
+    """
+    Serves an uploaded file. Uploads are never overwritten (they are named by their content hash, or by a random
+    name for the older ones), so the response can be cached for a year and revalidated with its ETag.
+
+    With MEDIA_ACCEL_REDIRECT set, only the headers are produced here and the file itself is sent by nginx from
+    the internal location of that prefix.
+
+    Args:
+    - request: HttpRequest object.
+    - path: path of the file relative to MEDIA_ROOT.
+
+    Returns:
+    - the file, a 304 Not Modified response or 404.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('File not found')
+    if not os.path.isfile(full_path):
+        raise Http404('File not found')
+
+    if is_hashed_name(path):
+        etag = '"%s"' % os.path.splitext(os.path.basename(path))[0]
+    else:
+        etag = '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        if settings.MEDIA_ACCEL_REDIRECT:
+            response = HttpResponse(content_type=mimetypes.guess_type(full_path)[0] or 'application/octet-stream')
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT + path
+            response['Last-Modified'] = http_date(stat.st_mtime)
+        else:
+            response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    response['ETag'] = etag
+    response['Cache-Control'] = MEDIA_CACHE_CONTROL
+    return response
@@ -0,0 +1,95 @@
+"""
+Module containing the warm-up run by the gunicorn master before it forks the workers (see d_site/gunicorn.conf.py).
+
+Everything a worker would otherwise do on its first requests is done once in the master: the URLconf is resolved,
+every template is compiled into the cached template loader, the content caches are filled and each public page is
+rendered once. The workers inherit all of it through fork and share the memory pages copy-on-write; gc.freeze()
+keeps the garbage collector from touching (and thereby copying) those objects.
+
+Functions:
+- compile_templates: compiles every template of the template directories.
+- prime_content: fills the content, image variant and bundle caches.
+- render_public_pages: renders the public pages once through the full middleware stack.
+- warm_up: runs all of the above and closes the connections the master must not share with the workers.
+"""
+
+
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template import engines
+from django.test import Client
+from django.urls import get_resolver, reverse
+
+from .bundles import get_bundle_manifest
+from .content_cache import get_content
+from .context_data import CONTENT_BLOCKS, CONTEXT_BUILDERS
+from .image_variants import get_variants
+
+
+logger = logging.getLogger(__name__)
+
+PUBLIC_PAGES = ('main_page:index', 'about', 'contacts', 'classes', 'join_us', 'schedule')
+
+
+def compile_templates():
+    """
+    Compiles every .html template found by the template loaders and keeps it in the cached loader.
+    :return: int, the number of compiled templates
+    """
+    compiled = 0
+    for engine in engines.all():
+        for directory in engine.template_dirs:
+            for root, _, files in os.walk(directory):
+                for filename in files:
+                    if filename.endswith('.html'):
+                        name = os.path.relpath(os.path.join(root, filename), directory)
+                        engine.get_template(name.replace(os.sep, '/'))
+                        compiled += 1
+    return compiled
+
+
+def prime_content():
+    """
+    Fills the content cache with every content block and sample pool, and loads the image variants and the bundle
+    manifest kept in the process.
+    """
+    get_content(CONTENT_BLOCKS)
+    for name in ('classes', 'gallery'):
+        CONTEXT_BUILDERS[name]()
+    get_variants()
+    get_bundle_manifest()
+
+
+def render_public_pages():
+    """
+    Renders every public page once, which also imports the lazily loaded modules and fills the page cache.
+    :return: dict mapping the path to its status code
+    """
+    host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS and settings.ALLOWED_HOSTS[0] != '*' else 'localhost'
+    client = Client(HTTP_HOST=host)
+    return {path: client.get(path).status_code for path in map(reverse, PUBLIC_PAGES)}
+
+
+def warm_up():
+    """
+    Runs the whole warm-up. Failures are logged and never prevent the server from starting.
+    The database and cache connections are closed at the end: a forked worker must open its own.
+    """
+    start = time.perf_counter()
+    try:
+        get_resolver().url_patterns
+        templates = compile_templates()
+        prime_content()
+        statuses = render_public_pages()
+        logger.info('Warmed up in %.0f ms: %d templates, pages %s',
+                    (time.perf_counter() - start) * 1000, templates, statuses)
+    except Exception:
+        logger.exception('Warm-up failed, the workers start cold')
+    finally:
+        connections.close_all()
+        caches.close_all()
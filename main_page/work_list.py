@@ -0,0 +1,108 @@
+"""
+Module containing the queries behind the manager work list.
+
+The unprocessed requests are paginated with keyset (cursor) pagination on (-date, -id), which is served by the
+(is_processed, -date) indexes and costs the same on the last page as on the first, unlike OFFSET. A cursor is the
+'<date>.<id>' of the last row of the previous page.
+
+Attributes:
+- WORK_LISTS: the models of the work list keyed by their kind.
+
+Classes:
+- KindConverter: URL path converter that matches only the kinds of WORK_LISTS.
+
+Functions:
+- get_pending_counts: counts the unprocessed requests of every kind in one query.
+- get_pending_page: returns one page of unprocessed requests of a kind and the cursor of the next page.
+- mark_processed: marks many requests of one kind as processed with a single UPDATE.
+"""
+
+
+import datetime
+
+from django.db import transaction
+from django.db.models import CharField, Count, Q, Value
+from django.utils import timezone
+
+from .models import ContactUs, Subscription, Appointment
+
+
+WORK_LISTS = {
+    'contact_us': ContactUs,
+    'subscription': Subscription,
+    'appointment': Appointment,
+}
+
+
+class KindConverter:
+    regex = '|'.join(WORK_LISTS)
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return value
+
+
+def get_pending_counts():
+    """
+    Counts the unprocessed requests of every kind with a single UNION ALL query.
+    :return: dict mapping the kind to the number of unprocessed requests
+    """
+    querysets = [
+        model.objects.filter(is_processed=False).order_by()
+        .annotate(kind=Value(kind, output_field=CharField())).values('kind').annotate(total=Count('pk'))
+        for kind, model in WORK_LISTS.items()
+    ]
+    counts = dict.fromkeys(WORK_LISTS, 0)
+    counts.update({row['kind']: row['total'] for row in querysets[0].union(*querysets[1:], all=True)})
+    return counts
+
+
+def _parse_cursor(cursor):
+    try:
+        date, pk = cursor.split('.')
+        return datetime.date.fromisoformat(date), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def get_pending_page(kind, cursor=None, size=50):
+    """
+    Returns one page of the unprocessed requests of a kind, newest first.
+
+    Args:
+    - kind: key of WORK_LISTS.
+    - cursor: the cursor returned for the previous page, None (or an invalid cursor) for the first page.
+    - size: the number of requests per page.
+
+    Returns:
+    - tuple of two elements: the list of requests and the cursor of the next page (None on the last page).
+    """
+    queryset = WORK_LISTS[kind].objects.filter(is_processed=False)
+    position = _parse_cursor(cursor)
+    if position:
+        date, pk = position
+        queryset = queryset.filter(Q(date__lt=date) | Q(date=date, pk__lt=pk))
+
+    items = list(queryset.order_by('-date', '-pk')[:size + 1])
+    if len(items) <= size:
+        return items, None
+    last = items[size - 1]
+    return items[:size], f'{last.date.isoformat()}.{last.pk}'
+
+
+def mark_processed(kind, ids):
+    """
+    Marks the unprocessed requests of a kind with the given ids as processed.
+
+    Args:
+    - kind: key of WORK_LISTS.
+    - ids: iterable of primary keys.
+
+    Returns:
+    - int, the number of updated requests.
+    """
+    with transaction.atomic():
+        return WORK_LISTS[kind].objects.filter(pk__in=ids, is_processed=False).update(
+            is_processed=True, date_processing=timezone.localdate())